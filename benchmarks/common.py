@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Helpers shared by the benchmarks. Importing it puts the checkout
+first in sys.path, so the benchmarks measure the client next to them
+rather than an installed one."""
+
+import os
+import resource
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def peakMemory():
+    """Returns the peak resident set size of the process, in megabytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    if sys.platform == 'darwin':
+        return peak / 1024.0 / 1024.0
+    return peak / 1024.0
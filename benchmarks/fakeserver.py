@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""An in-process stand-in for a Rexster server, serving a synthetic
+graph through the subset of the REST API used by the client: vertices,
+edges, adjacency listings and counts, manual indices, the batch
+extension and a Gremlin endpoint that only answers count() scripts.
+
+    server = FakeRexster(FakeGraph(vertices=1000, degree=5), latency=0.001)
+    server.start()
+    graph = RexsterGraph(RexsterServer(server.url), server.graph.name)
+"""
+
+import BaseHTTPServer
+import itertools
+import random
+import SocketServer
+import threading
+import time
+import urlparse
+from collections import OrderedDict
+
+import simplejson
+
+
+UNIFORM = 'uniform'
+POWERLAW = 'powerlaw'
+
+LABELS = ('knows', 'created')
+
+
+class FakeGraph(object):
+    """A synthetic property graph kept in memory"""
+
+    def __init__(self, vertices=1000, degree=5, distribution=UNIFORM,
+                name='benchmark', seed=0):
+        """Generates the graph
+        @params vertices: Number of vertices
+        @params degree: Mean number of outgoing edges per vertex
+        @params distribution: UNIFORM picks the edge ends uniformly,
+        POWERLAW favours a few vertices as in social graphs
+        @params name: The graph name
+        @params seed: Seed of the random generator"""
+        self.name = name
+        self.vertices = OrderedDict()
+        self.edges = OrderedDict()
+        self.outEdges = {}
+        self.inEdges = {}
+        self.indices = {}
+        self._ids = itertools.count(1)
+        self.lock = threading.RLock()
+        generator = random.Random(seed)
+        for i in xrange(vertices):
+            self.addVertex({'name': 'vertex%d' % i,
+                            'age': generator.randint(18, 80)})
+        ids = self.vertices.keys()
+        if not ids:
+            return
+        for i in xrange(vertices * degree):
+            if distribution == POWERLAW:
+                position = int(len(ids) * generator.paretovariate(1.2)) - \
+                            len(ids)
+                target = ids[position % len(ids)]
+            else:
+                target = generator.choice(ids)
+            self.addEdge(generator.choice(ids), target,
+                        generator.choice(LABELS),
+                        {'weight': round(generator.random(), 2)})
+        self.indices['names'] = {'class': 'vertex', 'type': 'manual',
+                                'entries': {}}
+        for _id, vertex in self.vertices.iteritems():
+            self.indexPut('names', 'name', vertex['name'], _id)
+
+    def _newId(self):
+        return str(next(self._ids))
+
+    def addVertex(self, properties, _id=None):
+        _id = _id or self._newId()
+        vertex = dict(properties)
+        vertex.update(_id=_id, _type='vertex')
+        self.vertices[_id] = vertex
+        self.outEdges[_id] = []
+        self.inEdges[_id] = []
+        return vertex
+
+    def addEdge(self, outV, inV, label, properties, _id=None):
+        _id = _id or self._newId()
+        edge = dict(properties)
+        edge.update(_id=_id, _type='edge', _outV=outV, _inV=inV,
+                    _label=label)
+        self.edges[_id] = edge
+        self.outEdges[outV].append(_id)
+        self.inEdges[inV].append(_id)
+        return edge
+
+    def removeEdge(self, _id):
+        edge = self.edges.pop(_id)
+        self.outEdges[edge['_outV']].remove(_id)
+        self.inEdges[edge['_inV']].remove(_id)
+
+    def removeVertex(self, _id):
+        for edge in self.outEdges[_id] + self.inEdges[_id]:
+            if edge in self.edges:
+                self.removeEdge(edge)
+        del self.vertices[_id]
+        del self.outEdges[_id]
+        del self.inEdges[_id]
+
+    def indexPut(self, name, key, value, _id):
+        entries = self.indices[name]['entries']
+        entries.setdefault((key, value), []).append(_id)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Answers are written in one piece, without Nagle delays
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, content):
+        body = simplejson.dumps(content)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else ''
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            return simplejson.loads(raw)
+        return dict((key, values[0])
+                    for key, values in urlparse.parse_qs(raw).iteritems())
+
+    def _handle(self):
+        server = self.server
+        server.requests += 1
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.random() * server.jitter)
+        url = urlparse.urlparse(self.path)
+        query = dict((key, values[0]) for key, values in
+                    urlparse.parse_qs(url.query,
+                                    keep_blank_values=True).iteritems())
+        body = self._body() if self.command in ('POST', 'PUT') else {}
+        parts = [part for part in url.path.split('/') if part]
+        graph = server.graph
+        with graph.lock:
+            status, content = _route(graph, self.command, parts, query, body)
+        self._send(status, content)
+
+    do_GET = do_POST = do_DELETE = do_HEAD = do_PUT = _handle
+
+
+def _page(items, query):
+    start = int(query.get('rexster.offset.start', 0))
+    end = query.get('rexster.offset.end')
+    end = int(end) if end is not None else None
+    results = list(itertools.islice(items, start, end))
+    return 200, {'results': results, 'totalSize': len(results)}
+
+
+_NOT_FOUND = (404, {'message': 'Not found'})
+
+
+def _route(graph, method, parts, query, body):
+    if not parts:
+        return 200, {'name': 'Rexster: A RESTful Graph Shell',
+                    'version': '0.5', 'upTime': '0:00:00',
+                    'graphs': [graph.name]}
+    if parts[0] != graph.name:
+        return _NOT_FOUND
+    if len(parts) == 1:
+        return 200, {'name': graph.name,
+                    'graph': 'fakegraph[vertices:%d edges:%d]' %
+                            (len(graph.vertices), len(graph.edges))}
+    collection, rest = parts[1], parts[2:]
+    if collection == 'vertices':
+        return _vertices(graph, method, rest, query, body)
+    if collection == 'edges':
+        return _edges(graph, method, rest, query, body)
+    if collection == 'indices':
+        return _indices(graph, method, rest, query, body)
+    if collection == 'tp' and rest:
+        return _extension(graph, method, rest, query, body)
+    return _NOT_FOUND
+
+
+def _properties(query, body):
+    properties = dict(query)
+    properties.update(body)
+    return properties
+
+
+def _vertices(graph, method, rest, query, body):
+    if not rest:
+        if method == 'POST':
+            return 200, {'results': graph.addVertex(_properties(query, body))}
+        return _page(graph.vertices.itervalues(), query)
+    _id = rest[0]
+    vertex = graph.vertices.get(_id)
+    if vertex is None:
+        if method == 'POST' and len(rest) == 1:
+            return 200, {'results': graph.addVertex(_properties(query, body),
+                                                    _id)}
+        return _NOT_FOUND
+    if len(rest) == 1:
+        return _element(graph, graph.removeVertex, vertex, method, query,
+                        body)
+    operation = rest[1]
+    label = query.get('_label')
+    out = [graph.edges[edge] for edge in graph.outEdges[_id]]
+    in_ = [graph.edges[edge] for edge in graph.inEdges[_id]]
+    if label:
+        out = [edge for edge in out if edge['_label'] == label]
+        in_ = [edge for edge in in_ if edge['_label'] == label]
+    if operation.endswith('Count'):
+        count = {'out': len(out), 'in': len(in_),
+                'both': len(out) + len(in_)}.get(operation[:-5])
+        if count is None:
+            return _NOT_FOUND
+        return 200, {'totalSize': count}
+    listings = {
+        'outE': lambda: out,
+        'inE': lambda: in_,
+        'bothE': lambda: out + in_,
+        'out': lambda: [graph.vertices[edge['_inV']] for edge in out],
+        'in': lambda: [graph.vertices[edge['_outV']] for edge in in_],
+        'both': lambda: [graph.vertices[edge['_inV']] for edge in out] +
+                        [graph.vertices[edge['_outV']] for edge in in_],
+    }
+    if operation not in listings:
+        return _NOT_FOUND
+    return _page(listings[operation](), query)
+
+
+def _edges(graph, method, rest, query, body):
+    if not rest:
+        if method == 'POST':
+            properties = _properties(query, body)
+            outV, inV = properties.pop('_outV'), properties.pop('_inV')
+            if outV not in graph.vertices or inV not in graph.vertices:
+                return 500, {'message': 'Vertex not found'}
+            return 200, {'results': graph.addEdge(
+                outV, inV, properties.pop('_label'), properties)}
+        return _page(graph.edges.itervalues(), query)
+    edge = graph.edges.get(rest[0])
+    if edge is None:
+        return _NOT_FOUND
+    return _element(graph, graph.removeEdge, edge, method, query, body)
+
+
+def _element(graph, remove, element, method, query, body):
+    if method == 'POST':
+        element.update(body)
+    elif method == 'DELETE':
+        if query:
+            for key in query:
+                element.pop(key, None)
+        else:
+            remove(element['_id'])
+            return 200, {}
+    return 200, {'results': element}
+
+
+def _indices(graph, method, rest, query, body):
+    if not rest:
+        return 200, {'results': [_describe(name, index) for name, index
+                                in graph.indices.iteritems()]}
+    name = rest[0]
+    index = graph.indices.get(name)
+    if index is None:
+        if method == 'POST':
+            index = graph.indices[name] = {'class': body.get('class'),
+                                            'type': body.get('type'),
+                                            'entries': {}}
+            return 200, {'results': _describe(name, index)}
+        return _NOT_FOUND
+    entries = index['entries']
+    if len(rest) > 1:
+        if rest[1] == 'count':
+            ids = entries.get((query.get('key'), query.get('value')), [])
+            return 200, {'totalSize': len(ids)}
+        if rest[1] == 'keys':
+            return 200, {'results': []}
+        return _NOT_FOUND
+    if method == 'POST':
+        graph.indexPut(name, body['key'], body['value'], body['id'])
+        return 200, {}
+    if method == 'DELETE':
+        if not query:
+            del graph.indices[name]
+        else:
+            ids = entries.get((query['key'], query['value']), [])
+            if query['id'] in ids:
+                ids.remove(query['id'])
+        return 200, {}
+    if 'key' in query:
+        store = graph.vertices if index['class'] == 'vertex' else graph.edges
+        ids = entries.get((query['key'], query['value']), [])
+        return _page([store[_id] for _id in ids if _id in store], query)
+    return 200, {'results': _describe(name, index)}
+
+
+def _describe(name, index):
+    return {'name': name, 'class': index['class'], 'type': index['type']}
+
+
+def _extension(graph, method, rest, query, body):
+    if rest[0] == 'gremlin':
+        script = body.get('script') or query.get('script') or ''
+        if script.rstrip().endswith('count()'):
+            return 200, {'results': [len(graph.vertices)]}
+        return 200, {'results': []}
+    if rest[0] == 'batch' and len(rest) == 2 and method == 'GET':
+        store = graph.vertices if rest[1] == 'vertices' else graph.edges
+        ids = [unicode(_id) for _id in simplejson.loads(query.get('id', '[]'))]
+        return 200, {'results': [store[_id] for _id in ids if _id in store]}
+    if rest[0] == 'batch' and rest[1:] == ['tx'] and method == 'POST':
+        for operation in body.get('tx', []):
+            _transaction(graph, operation)
+        return 200, {'success': True, 'txProcessed': len(body.get('tx', []))}
+    return _NOT_FOUND
+
+
+def _transaction(graph, operation):
+    operation = dict(operation)
+    action = operation.pop('_action')
+    _type = operation.pop('_type')
+    _id = unicode(operation.pop('_id'))
+    keys = operation.pop('_keys', None)
+    store = graph.vertices if _type == 'vertex' else graph.edges
+    if action == 'create' and _type == 'vertex':
+        graph.addVertex(operation, _id)
+    elif action == 'create':
+        graph.addEdge(unicode(operation.pop('_outV')),
+                    unicode(operation.pop('_inV')),
+                    operation.pop('_label'), operation, _id)
+    elif action == 'update':
+        store[_id].update(operation)
+    elif keys:
+        for key in keys:
+            store[_id].pop(key, None)
+    elif _type == 'vertex':
+        graph.removeVertex(_id)
+    else:
+        graph.removeEdge(_id)
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeRexster(object):
+    """Serves a FakeGraph over HTTP from a background thread"""
+
+    def __init__(self, graph, latency=0.0, jitter=0.0, port=0):
+        """Creates a new server
+        @params graph: The FakeGraph served
+        @params latency: Seconds every request waits before being answered
+        @params jitter: Maximum random seconds added to latency
+        @params port: The port listened, 0 picks a free one"""
+        self.graph = graph
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.graph = graph
+        self._server.latency = latency
+        self._server.jitter = jitter
+        self._server.requests = 0
+        self.url = 'http://127.0.0.1:%d' % self._server.server_address[1]
+        self._thread = None
+
+    @property
+    def requests(self):
+        """Number of requests answered so far"""
+        return self._server.requests
+
+    def start(self):
+        """Starts answering requests in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server"""
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Compares the latency of Gremlin scripts with their values formatted
+into the text, which the server compiles on every call, against the same
+script with bound parameters, which the server compiles only once.
+
+    python benchmarks/gremlin_params.py http://localhost:8182 tinkergraph
+"""
+
+import argparse
+import itertools
+import time
+
+import simplejson
+
+from common import percentile
+
+from rexster import RexsterGraph, RexsterServer
+
+
+SCRIPT = "g.v(%s).out.count()"
+BOUND_SCRIPT = SCRIPT % 'id'
+
+
+def measure(function, ids, iterations):
+    latencies = []
+    for i in xrange(iterations):
+        _id = ids[i % len(ids)]
+        started = time.time()
+        function(_id)
+        latencies.append((time.time() - started) * 1000)
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('host', help="Rexster server URL")
+    parser.add_argument('graph', help="Graph name")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--vertices', type=int, default=100,
+                        help="Number of distinct vertices queried")
+    args = parser.parse_args(argv)
+
+    graph = RexsterGraph(RexsterServer(args.host), args.graph)
+    vertices = graph.getVertices(pageSize=args.vertices)
+    ids = [vertex.getId()
+            for vertex in itertools.islice(vertices, args.vertices)]
+    graph.registerScript('outCount', BOUND_SCRIPT)
+
+    formatted = measure(
+        lambda _id: graph.gremlin_execute(SCRIPT % simplejson.dumps(_id)),
+        ids, args.iterations)
+    bound = measure(
+        lambda _id: graph.executeScript('outCount', {'id': _id}),
+        ids, args.iterations)
+
+    print "%-10s %10s %10s %10s" % ('', 'mean ms', 'p50 ms', 'p99 ms')
+    for name, latencies in (('formatted', formatted), ('bound', bound)):
+        print "%-10s %10.2f %10.2f %10.2f" % (
+            name, sum(latencies) / len(latencies),
+            percentile(latencies, 0.5), percentile(latencies, 0.99))
+    print "speedup: %.2fx" % (sum(formatted) / sum(bound))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Measures the common client operations against a local fake Rexster
+server: the requests sent per operation, operations per second, p50 and
+p99 latency and the peak memory of the process. Given a baseline, exits
+with status 1 when an operation sends more requests than recorded, which
+catches round-trip regressions without a real server.
+
+    python benchmarks/run.py --vertices 2000 --degree 8 --latency 0.001
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import itertools
+import random
+import sys
+import time
+
+import simplejson
+
+from common import peakMemory, percentile
+
+from rexster import RexsterIndexableGraph, RexsterServer
+
+from fakeserver import FakeGraph, FakeRexster, POWERLAW, UNIFORM
+
+
+class Context(object):
+    """The graph, vertices and index the operations run against"""
+
+    def __init__(self, graph, vertexCount, seed):
+        self.graph = graph
+        self.random = random.Random(seed)
+        self.vertices = list(itertools.islice(graph.getVertices(), 100))
+        self.names = ['vertex%d' % i for i in xrange(vertexCount)]
+        self.index = graph.getIndex('names', 'vertex')
+
+    def vertex(self):
+        return self.random.choice(self.vertices)
+
+
+def _outNeighbors(context):
+    for edge in context.vertex().getOutEdges():
+        edge.getInVertex()
+
+
+def _addEdge(context):
+    context.graph.addEdge(context.vertex(), context.vertex(), 'knows',
+                        {'weight': 0.5})
+
+
+OPERATIONS = (
+    ('getVertices', lambda context: list(context.graph.getVertices())),
+    ('getEdges', lambda context: list(context.graph.getEdges())),
+    ('getOutEdges', lambda context: list(context.vertex().getOutEdges())),
+    ('getInEdges', lambda context: list(context.vertex().getInEdges())),
+    ('getBothEdges', lambda context: list(context.vertex().getBothEdges())),
+    ('getOutVertices',
+        lambda context: list(context.vertex().getOutVertices())),
+    ('outNeighbors', _outNeighbors),
+    ('indexGet', lambda context: list(context.index.get(
+        'name', context.random.choice(context.names)))),
+    ('addVertex', lambda context: context.graph.addVertex(
+        properties={'name': 'new', 'age': 30})),
+    ('addEdge', _addEdge),
+    ('gremlin', lambda context: context.graph.gremlin_execute('g.V.count()')),
+)
+
+
+def measure(server, context, operation, iterations, seed):
+    """Runs an operation and returns its statistics"""
+    # Every operation picks the same vertices, whichever ran before
+    context.random.seed(seed)
+    instrumentation = server.instrument()
+    latencies = []
+    started = time.time()
+    for i in xrange(iterations):
+        before = time.time()
+        operation(context)
+        latencies.append((time.time() - before) * 1000)
+    elapsed = time.time() - started
+    requests = instrumentation.stats()['total']['requests']
+    return {'requestsPerOp': float(requests) / iterations,
+            'opsPerSecond': iterations / elapsed if elapsed else None,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'peakMemory': peakMemory()}
+
+
+def compare(results, baseline):
+    """Returns the operations sending more requests than the baseline"""
+    regressions = []
+    for name, stats in results:
+        expected = baseline.get(name)
+        if expected is not None and stats['requestsPerOp'] > expected:
+            regressions.append((name, expected, stats['requestsPerOp']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vertices', type=int, default=1000)
+    parser.add_argument('--degree', type=int, default=5,
+                        help="Mean number of outgoing edges per vertex")
+    parser.add_argument('--distribution', choices=(UNIFORM, POWERLAW),
+                        default=UNIFORM)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Seconds added to every server response")
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help="Maximum random seconds added to the latency")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', action='append', metavar='OPERATION',
+                        help="Operation to run, all of them by default")
+    parser.add_argument('--baseline', help="JSON file of the maximum "
+                        "requests per operation; exits with status 1 when "
+                        "one is exceeded")
+    parser.add_argument('--save-baseline', help="Writes the requests per "
+                        "operation measured to a JSON file")
+    args = parser.parse_args(argv)
+
+    fake = FakeRexster(FakeGraph(args.vertices, args.degree,
+                                args.distribution, seed=args.seed),
+                        args.latency, args.jitter).start()
+    server = RexsterServer(fake.url)
+    graph = RexsterIndexableGraph(server, fake.graph.name)
+    context = Context(graph, args.vertices, args.seed)
+
+    results = []
+    print "%-15s %10s %10s %10s %10s %10s" % (
+        '', 'requests', 'ops/s', 'p50 ms', 'p99 ms', 'peak MB')
+    for name, operation in OPERATIONS:
+        if args.only and name not in args.only:
+            continue
+        stats = measure(server, context, operation, args.iterations,
+                        args.seed)
+        results.append((name, stats))
+        print "%-15s %10.2f %10.1f %10.2f %10.2f %10.1f" % (
+            name, stats['requestsPerOp'], stats['opsPerSecond'],
+            stats['p50'], stats['p99'], stats['peakMemory'])
+    # Closing the connections first lets the server threads end
+    server.session.poolmanager.clear()
+    fake.stop()
+
+    # Requests per operation depend on the graph and the vertices picked,
+    # not on timing
+    shape = {'vertices': args.vertices, 'degree': args.degree,
+            'distribution': args.distribution, 'seed': args.seed,
+            'iterations': args.iterations}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as output:
+            simplejson.dump({'graph': shape,
+                            'requestsPerOp': dict(
+                                (name, stats['requestsPerOp'])
+                                for name, stats in results)},
+                            output, indent=4, sort_keys=True)
+            output.write('\n')
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            baseline = simplejson.load(baseline)
+        if baseline['graph'] != shape:
+            parser.error("the baseline was measured on another graph: %s" %
+                            baseline['graph'])
+        regressions = compare(results, baseline['requestsPerOp'])
+        for name, expected, actual in regressions:
+            print "REGRESSION %s: %.2f requests per operation, " \
+                    "baseline %.2f" % (name, actual, expected)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
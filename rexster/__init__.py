@@ -1,24 +1,210 @@
 #!/usr/bin/env python
 #-*- coding:utf-8 -*-
 
+import threading
+import time
+import urllib
+import uuid
+from multiprocessing.pool import ThreadPool
+
 import requests
 import simplejson
 
+from rexster.cache import LRUCache
+from rexster.instrumentation import Instrumentation
+from rexster.streaming import CHUNK_SIZE, iterResults
+
+
+PAGE_SIZE = 1000
+# Longest encoded list of identifiers sent in a single multi-get request,
+# keeping its URL below the 8KB most servers and proxies accept
+MAX_IDS_LENGTH = 6000
+
+SHORTEST_PATH_SCRIPT = ('(new edu.uci.ics.jung.algorithms.shortestpath.'
+                        'DijkstraShortestPath(new GraphJung(g)))'
+                        '.getPath(g.v(start),g.v(end))')
+
+# Consistency modes of the element property cache
+CACHED = 'cached'
+READ_THROUGH = 'read-through'
+FRESH = 'fresh'
+
+# Edge directions, relative to a vertex
+OUT = 'out'
+IN = 'in'
+BOTH = 'both'
+
+COUNT_SCRIPTS = {'vertices': 'g.V.count()', 'edges': 'g.E.count()'}
+
 
 class RexsterException(BaseException):
     pass
 
 
+def _prefetch(function, *args):
+    """Calls function in a background thread and returns a callable
+    that waits for and returns its result (or raises its exception)"""
+    result = {}
+
+    def target():
+        try:
+            result['value'] = function(*args)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+
+    def wait():
+        thread.join()
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+    return wait
+
+
 class RexsterServer(object):
     """An class that implements a way to connect to
     a Rexster Instance from Python"""
-    def __init__(self, host):
+    def __init__(self, host, poolConnections=10, poolMaxSize=10,
+                keepAlive=True, timeout=None, maxRetries=0, session=None):
+        """Creates a client of a Rexster server without requesting it;
+        the server document is loaded on its first use. Every request
+        made by the graphs, elements and indices of this server goes
+        through one pooled HTTP session
+        @params host: The server URL
+        @params poolConnections: Number of connection pools to keep
+        @params poolMaxSize: Maximum number of connections kept per pool
+        @params keepAlive: Whether connections are reused between requests
+        @params timeout: Seconds to wait for a response, None waits forever
+        @params maxRetries: Times a request is retried on connection errors
+        @params session: Optional session of another server, whose open
+        connections are then reused instead of creating a new pool"""
         self.host = host
-        r = requests.get(host)
+        if session is None:
+            session = requests.session(timeout=timeout, config={
+                'pool_connections': poolConnections,
+                'pool_maxsize': poolMaxSize,
+                'keep_alive': keepAlive,
+                'max_retries': maxRetries,
+            })
+        self.session = session
+        # Creates the connection pool of the host without connecting, as
+        # concurrent first requests would each create one, closing the
+        # pools of the others
+        self.session.poolmanager.connection_from_url(host)
+        self._data = None
+        self.hooks = []
+        self.instrumentation = None
+
+    def refresh(self):
+        """Requests the server document again, checking the server is
+        reachable"""
+        try:
+            r = self._request('get', self.host)
+        except requests.exceptions.RequestException:
+            raise RexsterException("Could not connect to a Rexster server")
         if r.error:
             raise RexsterException("Could not connect to a Rexster server")
-        else:
-            self.data = simplejson.loads(r.content)
+        self._data = self._decode(r)
+
+    @property
+    def data(self):
+        """The server document, requested on the first access"""
+        if self._data is None:
+            self.refresh()
+        return self._data
+
+    def _request(self, method, url, readOnly=None, **kwargs):
+        """Sends a request through the pooled session, between the
+        before() and after() calls of the hooks. readOnly tells whether
+        the request only reads the graph, for the servers routing reads
+        elsewhere than writes, None guessing it from the request"""
+        if not self.hooks:
+            return self.session.request(method, url, **kwargs)
+        for hook in self.hooks:
+            hook.before(method, url, kwargs)
+        started = time.time()
+        try:
+            r = self.session.request(method, url, **kwargs)
+        except BaseException as e:
+            elapsed = time.time() - started
+            for hook in self.hooks:
+                hook.after(method, url, kwargs, None, elapsed, e)
+            raise
+        elapsed = time.time() - started
+        for hook in self.hooks:
+            hook.after(method, url, kwargs, r, elapsed, None)
+        return r
+
+    def _decode(self, r):
+        """Decodes the JSON body of a response, reporting the time spent
+        to the hooks"""
+        if not self.hooks:
+            return simplejson.loads(r.content)
+        started = time.time()
+        content = simplejson.loads(r.content)
+        elapsed = time.time() - started
+        for hook in self.hooks:
+            hook.decoded(r.request.method, r.url, elapsed)
+        return content
+
+    def addHook(self, hook):
+        """Adds a hook called around every request of the server
+        @params hook: A rexster.instrumentation.Hook"""
+        self.hooks = self.hooks + [hook]
+
+    def removeHook(self, hook):
+        """Removes a hook added with addHook
+        @params hook: The hook to remove"""
+        self.hooks = [other for other in self.hooks if other is not hook]
+
+    def instrument(self, burstThreshold=None, burstGap=1.0, burstLog=None):
+        """Starts collecting the statistics of the requests returned by
+        stats(), replacing the ones collected before
+        @params burstThreshold: Optional number of requests to the same
+        endpoint from the same public method, each less than burstGap
+        seconds after the previous one, recorded as an N+1 burst
+        @params burstGap: Seconds without a request that end a burst
+        @params burstLog: Optional file object every burst is written to
+
+        @returns The rexster.instrumentation.Instrumentation hook"""
+        if self.instrumentation is not None:
+            self.removeHook(self.instrumentation)
+        self.instrumentation = Instrumentation(burstThreshold, burstGap,
+                                                burstLog)
+        self.addHook(self.instrumentation)
+        return self.instrumentation
+
+    def stats(self):
+        """Returns the request count, errors, latency percentiles,
+        bytes and decode time of every endpoint since instrument()
+
+        @returns A dictionary of statistics by endpoint, empty when the
+        server is not instrumented"""
+        if self.instrumentation is None:
+            return {}
+        return self.instrumentation.stats()
+
+    def poolStats(self):
+        """Returns the counters of the connection pools currently open:
+        the requests sent, the connections reused for them (hits) and
+        the new connections opened (misses)
+
+        @returns A dictionary with requests, hits and misses"""
+        requests_sent = 0
+        connections = 0
+        pools = self.session.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+        return {'requests': requests_sent,
+                'hits': max(requests_sent - connections, 0),
+                'misses': connections}
 
     def name(self):
         """Return server name"""
@@ -29,7 +215,7 @@ class RexsterServer(object):
         return self.data.get('version')
 
     def uptime(self):
-        """Return server uptime"""
+        """Return server uptime, as of the last refresh()"""
         return self.data.get('upTime')
 
     def graphs(self):
@@ -37,10 +223,53 @@ class RexsterServer(object):
         return self.data.get('graphs')
 
 
+# Index class of the vertices and edges by their REST resource
+_INDEX_CLASSES = {'vertices': 'vertex', 'edges': 'edge'}
+
+
+def _indexClass(element):
+    """Returns 'vertex' or 'edge' for a Vertex, an Edge or a handle of
+    one, None for anything else"""
+    return _INDEX_CLASSES.get(getattr(element, '_resource', None))
+
+
+def _elementId(element):
+    """Returns the id of a Vertex, an Edge or a handle, or element
+    itself when it is already an identifier"""
+    if _indexClass(element) is not None:
+        return element.getId()
+    return element
+
+
+def _dumpIds(ids):
+    return simplejson.dumps(ids, separators=(',', ':'))
+
+
+def _idWindows(ids):
+    """Splits identifiers into lists whose JSON encoding, as sent in the
+    query string of a multi-get request, is at most MAX_IDS_LENGTH long"""
+    window = []
+    # The encoded brackets
+    length = 6
+    for _id in ids:
+        # The id and its encoded comma
+        size = len(urllib.quote_plus(_dumpIds(_id))) + 3
+        if window and length + size > MAX_IDS_LENGTH:
+            yield window
+            window = []
+            length = 6
+        window.append(_id)
+        length += size
+    if window:
+        yield window
+
+
 class Element(object):
     """An class defining an Element object composed
     by a collection of key/value properties for the
     Rexster compatible database"""
+    # Overrides the cache mode of the graph for this element when set
+    cacheMode = None
 
     def __init__(self, graph, url):
         """Creates a new element
@@ -50,15 +279,55 @@ class Element(object):
         @returns The element"""
         self.url = url
         self.graph = graph
-        r = requests.get(url)
-        content = simplejson.loads(r.content)
-        properties = content.get('results')
-        if not properties:
-            raise RexsterException(content['message'])
+        self.refresh()
+
+    @classmethod
+    def from_payload(cls, graph, payload):
+        """Creates an element from the JSON object already returned
+        by Rexster, without requesting it again
+        @params graph: The graph object the element belongs
+        @params payload: The element JSON object
+
+        @returns The element"""
+        element = cls.__new__(cls)
+        element.url = "%s/%s/%s" % (graph.url, cls._resource,
+                                    payload.get('_id'))
+        element.graph = graph
+        element._setProperties(payload)
+        return element
+
+    def _setProperties(self, properties):
         self.properties = {}
         for key, value in properties.iteritems():
             self.properties[key] = value
         self._id = self.properties.get('_id')
+        self._loadedAt = time.time()
+        if self.graph._writeBehind is not None:
+            self.graph._writeBehind.overlay(self.url, self.properties)
+
+    def _getProperties(self):
+        """Returns the properties dictionary, reloading it first when
+        the cache mode of the element requires it"""
+        mode = self.cacheMode or self.graph.cacheMode
+        if (mode == FRESH or self._loadedAt is None or
+                (mode == READ_THROUGH and
+                time.time() - self._loadedAt > self.graph.cacheTTL)):
+            self.refresh()
+        return self.properties
+
+    def invalidate(self):
+        """Marks the cached properties as stale, so they are reloaded
+        on the next read"""
+        self._loadedAt = None
+
+    def refresh(self):
+        """Reloads the element properties from the server"""
+        r = self.graph.server._request('get', self.url)
+        content = self.graph.server._decode(r)
+        properties = content.get('results')
+        if not properties:
+            raise RexsterException(content['message'])
+        self._setProperties(properties)
 
     def getId(self):
         """Returns the unique identifier of the element
@@ -70,56 +339,68 @@ class Element(object):
         """Sets the property of the element to the given value
         @params key: The property key to set
         @params value: The value to set"""
-        r = requests.post(self.url, data={key: value})
+        if self.graph._writeBehind is not None:
+            self.properties[key] = value
+            self.graph._discardCopies(self)
+            self.graph._writeBehind.setProperty(self, key, value)
+            return
+        r = self.graph.server._request('post', self.url, data={key: value})
         if r.error:
-            error_msg = simplejson.loads(r.content)['message']
+            error_msg = self.graph.server._decode(r)['message']
             raise RexsterException(error_msg)
         self.properties[key] = value
+        self.graph._discardCopies(self)
+        self.graph._propertiesChanged(self, [key])
 
     def getProperty(self, key):
         """Gets the value of the property for the given key
         @params key: The key which value is being retrieved
 
         @returns The value of the property with the given key"""
-        r = requests.get(self.url)
-        properties = simplejson.loads(r.content)
-        if r.error:
-            raise RexsterException(properties['message'])
-        else:
-            return properties['results'].get(key)
+        return self._getProperties().get(key)
 
     def getPropertyKeys(self):
         """Returns a set with the property keys of the element
 
         @returns Set of property keys"""
-        r = requests.get(self.url)
-        properties = simplejson.loads(r.content)
-        if r.error:
-            raise RexsterException(properties['message'])
-        else:
-            return properties['results'].keys()
+        return self._getProperties().keys()
 
     def removeProperty(self, key):
         """Removes the value of the property for the given key
         @params key: The key which value is being removed"""
-        r = requests.delete(self.url, params=key)
+        if self.graph._writeBehind is not None:
+            self.properties.pop(key, None)
+            self.graph._discardCopies(self)
+            self.graph._writeBehind.removeProperty(self, key)
+            return
+        r = self.graph.server._request('delete', self.url,
+                                            params={key: ''})
         if r.error:
-            error_msg = simplejson.loads(r.content)['message']
+            error_msg = self.graph.server._decode(r)['message']
             raise RexsterException(error_msg)
-        self.properties.pop(key)
+        self.properties.pop(key, None)
+        self.graph._discardCopies(self)
+        self.graph._propertiesChanged(self, [key])
 
     def __eq__(self, other):
-        """Two elements are equals when they are the same type() and the same id
+        """Two elements are equals when they are both vertices or both
+        edges, full elements or handles, with the same id. Ids are
+        compared as text, as handles keep the id they were given
         @params other: the objects to be compared with"""
-	if type(self) == type(other):
-		return self.getId() == other.getId()
-	else:
-		return False
+        return getattr(other, '_resource', None) == self._resource and \
+            unicode(self.getId()) == unicode(other.getId())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._resource, unicode(self.getId())))
 
 
 class Vertex(Element):
     """An abstract class defining a Vertex object representing
     a node of the graph with a set of properties"""
+    _resource = 'vertices'
 
     def __init__(self, graph, _id):
         """Creates a new vertex
@@ -127,54 +408,157 @@ class Vertex(Element):
         @params _id: The vertex unique identifier
 
         @returns The vertex"""
-        url = "%s/vertices/%s" % (graph.url, _id)
+        url = "%s/%s/%s" % (graph.url, self._resource, _id)
         super(Vertex, self).__init__(graph, url)
 
-    def _generator(self, generator):
+    def _generator(self, generator, lazy=False):
         for item in generator:
-            yield Edge(self.graph, item.get('_id'))
+            if lazy:
+                yield LazyEdge.from_payload(self.graph, item)
+            else:
+                yield self.graph._hydrate(Edge, item)
 
-    def getOutEdges(self, label=None):
+    def getOutEdges(self, label=None, pageSize=None, lazy=False):
         """Gets all the outgoing edges of the node. If label
         parameter is provided, it only returns the edges of
         the given label
         @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of edges requested at once
+        @params lazy: Whether to return LazyEdge handles instead
 
         @returns A generator function with the outgoing edges"""
-        if label:
-            url = "%s/outE?_label=%s" % (self.url, label)
-        else:
-            url = "%s/outE" % self.url
-        r = requests.get(url)
-        return self._generator(simplejson.loads(r.content)['results'])
+        url = "%s/outE" % self.url
+        params = {'_label': label} if label else None
+        return self._generator(self.graph._iterResults(url, params,
+                                                        pageSize), lazy)
 
-    def getInEdges(self, label=None):
+    def getInEdges(self, label=None, pageSize=None, lazy=False):
         """Gets all the incoming edges of the node. If label
         parameter is provided, it only returns the edges of
         the given label
         @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of edges requested at once
+        @params lazy: Whether to return LazyEdge handles instead
 
         @returns A generator function with the incoming edges"""
-        if label:
-            url = "%s/inE?_label=%s" % (self.url, label)
-        else:
-            url = "%s/inE" % self.url
-        r = requests.get(url)
-        return self._generator(simplejson.loads(r.content)['results'])
+        url = "%s/inE" % self.url
+        params = {'_label': label} if label else None
+        return self._generator(self.graph._iterResults(url, params,
+                                                        pageSize), lazy)
 
-    def getBothEdges(self, label=None):
+    def getBothEdges(self, label=None, pageSize=None, lazy=False):
         """Gets all the edges of the node. If label
         parameter is provided, it only returns the edges of
         the given label
         @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of edges requested at once
+        @params lazy: Whether to return LazyEdge handles instead
 
         @returns A generator function with the incoming edges"""
-        if label:
-            url = "%s/bothE?_label=%s" % (self.url, label)
-        else:
-            url = "%s/bothE" % self.url
-        r = requests.get(url)
-        return self._generator(simplejson.loads(r.content)['results'])
+        url = "%s/bothE" % self.url
+        params = {'_label': label} if label else None
+        return self._generator(self.graph._iterResults(url, params,
+                                                        pageSize), lazy)
+
+    def _vertexGenerator(self, generator, lazy=False):
+        for item in generator:
+            if lazy:
+                yield LazyVertex.from_payload(self.graph, item)
+            else:
+                yield self.graph._hydrate(Vertex, item)
+
+    def getOutVertices(self, label=None, pageSize=None, lazy=False):
+        """Gets the vertices at the end of the outgoing edges of
+        the node without loading the edges. If label parameter is
+        provided, it only follows the edges of the given label
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of vertices requested at once
+        @params lazy: Whether to return LazyVertex handles instead
+
+        @returns A generator function with the adjacent vertices"""
+        url = "%s/out" % self.url
+        params = {'_label': label} if label else None
+        return self._vertexGenerator(self.graph._iterResults(url, params,
+                                                            pageSize), lazy)
+
+    def getInVertices(self, label=None, pageSize=None, lazy=False):
+        """Gets the vertices at the start of the incoming edges of
+        the node without loading the edges. If label parameter is
+        provided, it only follows the edges of the given label
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of vertices requested at once
+        @params lazy: Whether to return LazyVertex handles instead
+
+        @returns A generator function with the adjacent vertices"""
+        url = "%s/in" % self.url
+        params = {'_label': label} if label else None
+        return self._vertexGenerator(self.graph._iterResults(url, params,
+                                                            pageSize), lazy)
+
+    def getBothVertices(self, label=None, pageSize=None, lazy=False):
+        """Gets the vertices adjacent to the node without loading
+        the edges. If label parameter is provided, it only follows
+        the edges of the given label
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of vertices requested at once
+        @params lazy: Whether to return LazyVertex handles instead
+
+        @returns A generator function with the adjacent vertices"""
+        url = "%s/both" % self.url
+        params = {'_label': label} if label else None
+        return self._vertexGenerator(self.graph._iterResults(url, params,
+                                                            pageSize), lazy)
+
+    def _count(self, direction, label):
+        url = "%s/%sCount" % (self.url, direction)
+        params = {'_label': label} if label else None
+        r = self.graph.server._request('get', url, params=params)
+        content = self.graph.server._decode(r)
+        if r.error:
+            raise RexsterException(content['message'])
+        return content['totalSize']
+
+    def countOutVertices(self, label=None):
+        """Returns the number of outgoing edges of the node, and so
+        of vertices reached through them, in one small request
+        @params label: Optional parameter to filter the edges
+
+        @returns The number of outgoing edges"""
+        return self._count('out', label)
+
+    def countInVertices(self, label=None):
+        """Returns the number of incoming edges of the node, and so
+        of vertices reached through them, in one small request
+        @params label: Optional parameter to filter the edges
+
+        @returns The number of incoming edges"""
+        return self._count('in', label)
+
+    def countBothVertices(self, label=None):
+        """Returns the number of edges of the node, and so of
+        adjacent vertices reached through them, in one small request
+        @params label: Optional parameter to filter the edges
+
+        @returns The number of edges"""
+        return self._count('both', label)
+
+    def degree(self, direction=BOTH, label=None):
+        """Returns the number of edges of the node in one small request,
+        without listing them
+        @params direction: OUT, IN or BOTH
+        @params label: Optional parameter to filter the edges
+
+        @returns The number of edges"""
+        if direction not in (OUT, IN, BOTH):
+            raise RexsterException("%s is not a valid direction" % direction)
+        return self._count(direction, label)
+
+    def traverse(self):
+        """Starts a traversal at this vertex. Its steps are executed
+        together as a single Gremlin script in the server
+
+        @returns A Traversal object"""
+        return Traversal(self.graph, self._id)
 
     def __str__(self):
         return "Vertex %s: %s" % (self._id, self.properties)
@@ -183,6 +567,7 @@ class Vertex(Element):
 class Edge(Element):
     """An abstract class defining a Edge object representing
     a relationship of the graph with a set of properties"""
+    _resource = 'edges'
 
     def __init__(self, graph, _id):
         """Creates a new edge
@@ -190,20 +575,20 @@ class Edge(Element):
         @params _id: The edge unique identifier
 
         @returns The edge"""
-        url = "%s/edges/%s" % (graph.url, _id)
+        url = "%s/%s/%s" % (graph.url, self._resource, _id)
         super(Edge, self).__init__(graph, url)
 
     def getOutVertex(self):
         """Returns the origin Vertex of the relationship
 
         @returns The origin Vertex"""
-        return Vertex(self.graph, self.properties.get('_outV'))
+        return self.graph._getElement(Vertex, self.properties.get('_outV'))
 
     def getInVertex(self):
         """Returns the target Vertex of the relationship
 
         @returns The target Vertex"""
-        return Vertex(self.graph, self.properties.get('_inV'))
+        return self.graph._getElement(Vertex, self.properties.get('_inV'))
 
     def getLabel(self):
         """Returns the label of the relationship
@@ -217,30 +602,288 @@ class Edge(Element):
 
 class RexsterGraph(object):
 
-    def __init__(self, server, name):
+    def __init__(self, server, name, pageSize=PAGE_SIZE, stream=False,
+                cacheMode=FRESH, cacheTTL=60, elementCacheSize=0,
+                elementCacheTTL=None, indexCacheSize=0, indexCacheTTL=None,
+                invalidationBus=None):
+        """Creates a new graph
+        @params server: The RexsterServer the graph is served by
+        @params name: The graph name
+        @params pageSize: Number of elements requested at once by the
+        listing methods, None or 0 requests whole collections at once
+        @params stream: Whether listing responses are decoded incrementally
+        while they are read instead of being loaded as a whole
+        @params cacheMode: How element properties are read: CACHED from
+        the loaded copy, READ_THROUGH reloading it after cacheTTL seconds,
+        or FRESH from the server on every read
+        @params cacheTTL: Seconds a READ_THROUGH copy is served
+        @params elementCacheSize: Maximum number of vertices and edges kept
+        so the same id returns the same object, 0 disables the cache
+        @params elementCacheTTL: Optional seconds an element is kept
+        @params indexCacheSize: Maximum number of index lookups whose
+        element ids are kept, 0 disables the cache
+        @params indexCacheTTL: Optional seconds an index lookup is kept
+        @params invalidationBus: Optional rexster.invalidation.Bus the
+        changes made through the graph are published to, and the changes
+        made by the other clients are received from to drop the cached
+        elements and lookups they made stale"""
+        if cacheMode not in (CACHED, READ_THROUGH, FRESH):
+            raise RexsterException("%s is not a valid cacheMode" % cacheMode)
         self.server = server
         self.name = name
         self.url = "%s/%s" % (server.host, name)
+        self.pageSize = pageSize
+        self.stream = stream
+        self.cacheMode = cacheMode
+        self.cacheTTL = cacheTTL
+        if elementCacheSize:
+            self.elementCache = LRUCache(elementCacheSize, elementCacheTTL)
+        else:
+            self.elementCache = None
+        if indexCacheSize:
+            self.indexCache = LRUCache(indexCacheSize, indexCacheTTL)
+        else:
+            self.indexCache = None
+        # Whether the server provides the batch extension, None if unknown
+        self._batchSupported = None
+        # Whether the server provides the Gremlin extension, None if unknown
+        self._gremlinSupported = None
+        self.scripts = {}
+        self._metadata = None
+        # The WriteBehind buffer of property changes, None when disabled
+        self._writeBehind = None
+        self.invalidationBus = invalidationBus
+        # Identifies the messages of this graph object on the bus
+        self._origin = uuid.uuid4().hex
+        if invalidationBus is not None:
+            invalidationBus.subscribe(self._invalidate)
+
+    def refresh(self):
+        """Drops the cached graph metadata, which is requested again on
+        its next use"""
+        self._metadata = None
+
+    def _hydrate(self, cls, payload):
+        """Returns the element for a JSON payload, updating and reusing
+        the cached object with the same id when there is one"""
+        if self.elementCache is None:
+            return cls.from_payload(self, payload)
+        key = (cls._resource, unicode(payload.get('_id')))
+        element = self.elementCache.get(key)
+        if element is None:
+            element = cls.from_payload(self, payload)
+            self.elementCache.put(key, element)
+        else:
+            element._setProperties(payload)
+        return element
+
+    def _getElement(self, cls, _id):
+        """Returns the cached element with the given id, requesting
+        it only when it is not cached"""
+        if self.elementCache is None:
+            return cls(self, _id)
+        key = (cls._resource, unicode(_id))
+        element = self.elementCache.get(key)
+        if element is None:
+            element = cls(self, _id)
+            self.elementCache.put(key, element)
+        return element
+
+    def _forgetVertex(self, _id):
+        """Drops a removed vertex and its edges from the cache"""
+        self._forgetIndexed(Vertex, _id)
+        if self._writeBehind is not None:
+            self._writeBehind.discard(Vertex, _id)
+        if self.elementCache is not None:
+            _id = unicode(_id)
+            self.elementCache.remove((Vertex._resource, _id))
+            self.elementCache.removeWhere(lambda key, element:
+                key[0] == Edge._resource and
+                _id in (unicode(element.properties.get('_outV')),
+                        unicode(element.properties.get('_inV'))))
+
+    def _forgetEdge(self, _id):
+        """Drops a removed edge from the cache"""
+        self._forgetIndexed(Edge, _id)
+        if self._writeBehind is not None:
+            self._writeBehind.discard(Edge, _id)
+        if self.elementCache is not None:
+            self.elementCache.remove((Edge._resource, unicode(_id)))
+
+    def _forgetIndexed(self, cls, _id):
+        """Drops the cached index lookups listing a removed element.
+        The edges of a removed vertex are removed as well, and as their
+        ids are not known every cached edge lookup is dropped"""
+        if self.indexCache is not None:
+            _id = unicode(_id)
+            self.indexCache.removeWhere(lambda lookup, entry:
+                entry[0] == cls._resource and _id in entry[1] or
+                cls is Vertex and entry[0] == Edge._resource)
+
+    def _discardCopies(self, element):
+        """Drops the cached element with the id of the given one when
+        it is a different object, as it missed the changes just made"""
+        if self.elementCache is not None:
+            key = (element._resource, unicode(element.getId()))
+            cached = self.elementCache.peek(key)
+            if cached is not None and cached is not element:
+                self.elementCache.remove(key)
+
+    def _forgetLookups(self, indexName=None, key=None, value=None):
+        """Drops the cached index lookups of the given index, key and
+        value, any of them matching everything when None"""
+        if self.indexCache is not None:
+            wanted = (indexName, key,
+                        None if value is None else unicode(value))
+            self.indexCache.removeWhere(lambda lookup, ids: all(
+                field is None or field == current
+                for field, current in zip(wanted, lookup)))
+
+    def _publish(self, resource, _id, **fields):
+        if self.invalidationBus is not None:
+            message = {'origin': self._origin, 'graph': self.name,
+                        'resource': resource, 'id': _id}
+            message.update(fields)
+            self.invalidationBus.publish(message)
+
+    def _propertiesChanged(self, element, keys):
+        """Drops the lookups of the changed keys, which automatic
+        indices may have updated, and tells the other clients"""
+        for key in keys:
+            self._forgetLookups(key=key)
+        self._publish(element._resource, element.getId(), keys=list(keys))
+
+    def _elementRemoved(self, cls, _id):
+        if cls is Vertex:
+            self._forgetVertex(_id)
+        else:
+            self._forgetEdge(_id)
+        self._publish(cls._resource, _id, removed=True)
+
+    def _indexChanged(self, indexName, key=None, value=None, removed=False):
+        self._forgetLookups(indexName, key, value)
+        self._publish('indices', indexName, key=key,
+                    value=None if value is None else unicode(value),
+                    removed=removed)
+
+    def _invalidate(self, message):
+        """Drops what a change published by another client made stale"""
+        if message.get('origin') == self._origin or \
+                message.get('graph') != self.name:
+            return
+        resource = message.get('resource')
+        _id = message.get('id')
+        if resource == 'indices':
+            self._forgetLookups(_id, message.get('key'), message.get('value'))
+        elif message.get('removed'):
+            if resource == Vertex._resource:
+                self._forgetVertex(_id)
+            else:
+                self._forgetEdge(_id)
+        else:
+            if self.elementCache is not None:
+                element = self.elementCache.peek((resource, unicode(_id)))
+                if element is not None:
+                    element.invalidate()
+            keys = message.get('keys')
+            if keys is None:
+                self._forgetLookups()
+            for key in keys or []:
+                self._forgetLookups(key=key)
+
+    def _pageParams(self, params, start, end):
+        params = dict(params or {})
+        if start is not None:
+            params['rexster.offset.start'] = start
+            params['rexster.offset.end'] = end
+        return params
+
+    def _getPage(self, url, params, start=None, end=None):
+        params = self._pageParams(params, start, end)
+        r = self.server._request('get', url, params=params)
+        content = self.server._decode(r)
+        if r.error:
+            raise RexsterException(content['message'])
+        return content['results']
 
-    def getMetadata(self):
-        r = requests.get(self.url)
-        return simplejson.loads(r.content)
+    def _streamResults(self, method, url, **kwargs):
+        """Sends a request and yields the items of its results array
+        while the response body is being read"""
+        r = self.server._request(method, url, prefetch=False, **kwargs)
+        if r.error:
+            raise RexsterException(self.server._decode(r)['message'])
+        for item in iterResults(r.iter_content(CHUNK_SIZE)):
+            yield item
+
+    def _streamPage(self, url, params, start=None, end=None):
+        params = self._pageParams(params, start, end)
+        return self._streamResults('get', url, params=params)
+
+    def _iterResults(self, url, params=None, pageSize=None):
+        """Yields the results of a collection resource page by page.
+        The next page is requested in the background while the current
+        one is being consumed, unless the graph streams its responses
+        @params url: The collection REST URL
+        @params params: Optional query parameters
+        @params pageSize: Elements per page, defaults to the graph pageSize
+
+        @returns A generator over the JSON objects of the results"""
+        if pageSize is None:
+            pageSize = self.pageSize
+        if not pageSize:
+            fetch = self._streamPage if self.stream else self._getPage
+            for item in fetch(url, params):
+                yield item
+            return
+        start = 0
+        if self.stream:
+            # Pages are read one after the other so that only the item
+            # being decoded is held in memory
+            while True:
+                count = 0
+                for item in self._streamPage(url, params,
+                                            start, start + pageSize):
+                    count += 1
+                    yield item
+                if count < pageSize:
+                    return
+                start += pageSize
+        page = _prefetch(self._getPage, url, params, start, start + pageSize)
+        while page:
+            results = page()
+            start += pageSize
+            if len(results) < pageSize:
+                page = None
+            else:
+                page = _prefetch(self._getPage, url, params,
+                                start, start + pageSize)
+            for item in results:
+                yield item
 
-    def addVertex(self, _id=None):
+    def getMetadata(self):
+        """Returns the graph metadata, requested only on the first call
+        and after refresh()"""
+        if self._metadata is None:
+            r = self.server._request('get', self.url)
+            self._metadata = self.server._decode(r)
+        return self._metadata
+
+    def addVertex(self, _id=None, properties=None):
         """Adds a new vertex
         @params _id: Node unique identifier
+        @params properties: Optional dictionary of vertex properties
 
         @returns The created Vertex or None"""
         if _id:
             url = "%s/vertices/%s" % (self.url, _id)
         else:
             url = "%s/vertices" % (self.url)
-        r = requests.post(url)
+        r = self.server._request('post', url, data=properties)
         if r.error:
             raise RexsterException("Could not create vertex")
         else:
-            properties = simplejson.loads(r.content)['results']
-            return Vertex(self, properties['_id'])
+            properties = self.server._decode(r)['results']
+            return self._hydrate(Vertex, properties)
 
     def getVertex(self, _id):
         """Retrieves an existing vertex from the graph
@@ -248,56 +891,221 @@ class RexsterGraph(object):
 
         @returns The requested Vertex or None"""
         try:
-            return Vertex(self, _id)
+            return self._getElement(Vertex, _id)
         except RexsterException:
             return None
 
-    def getVertices(self):
-        """Returns an iterator with all the vertices"""
+    def _exists(self, cls, _id):
+        url = "%s/%s/%s" % (self.url, cls._resource, _id)
+        r = self.server._request('head', url)
+        if r.status_code == 405:
+            # Servers not answering HEAD are asked for the element itself
+            r = self.server._request('get', url)
+        return r.status_code == 200
+
+    def hasVertex(self, _id):
+        """Checks whether a vertex exists without retrieving it
+        @params _id: Node unique identifier
+
+        @returns True if the vertex exists"""
+        return self._exists(Vertex, _id)
+
+    def _countElements(self, resource):
+        """Counts the vertices or the edges with a Gremlin script, or by
+        listing their ids when the server has no Gremlin extension"""
+        if self._gremlinSupported is not False:
+            url = '%s/tp/gremlin' % (self.url)
+            r = self.server._request('post', url,
+                                    data={'script': COUNT_SCRIPTS[resource]},
+                                    readOnly=True)
+            if r.ok:
+                self._gremlinSupported = True
+                return int(self.server._decode(r)['results'][0])
+            if r.status_code == 404:
+                self._gremlinSupported = False
+            elif self._gremlinSupported:
+                raise RexsterException("Could not count %s" % resource)
+        if resource == 'vertices':
+            elements = self.getVertices(lazy=True)
+        else:
+            elements = self.getEdges(lazy=True)
+        return sum(1 for element in elements)
+
+    def countVertices(self):
+        """Returns the number of vertices of the graph, counted in the
+        server with Gremlin when available
+
+        @returns The number of vertices"""
+        return self._countElements('vertices')
+
+    def _getPayload(self, cls, _id):
+        url = "%s/%s/%s" % (self.url, cls._resource, _id)
+        r = self.server._request('get', url)
+        if r.error:
+            return None
+        return self.server._decode(r).get('results')
+
+    def _getBatchPayloads(self, cls, ids):
+        """Requests several elements through the batch extension
+
+        @returns The list of found JSON objects, or None when the server
+        does not provide the extension"""
+        url = "%s/tp/batch/%s" % (self.url, cls._resource)
+        r = self.server._request('get', url,
+                                params={'id': _dumpIds(ids)})
+        if r.status_code == 404:
+            self._batchSupported = False
+            return None
+        if 400 <= r.status_code < 500:
+            # A request the server or a proxy refuses, such as a URL
+            # still too long, is sent again as single requests
+            return None
+        content = self.server._decode(r)
+        if r.error:
+            raise RexsterException(content['message'])
+        self._batchSupported = True
+        return content['results']
+
+    def _getElementsByIds(self, cls, ids, maxWorkers):
+        for window in _idWindows(ids):
+            found = {}
+            missing = []
+            for _id in window:
+                element = None
+                if self.elementCache is not None:
+                    element = self.elementCache.get((cls._resource,
+                                                    unicode(_id)))
+                if element is None:
+                    missing.append(_id)
+                else:
+                    found[unicode(_id)] = element
+            payloads = None
+            if missing and self._batchSupported is not False:
+                payloads = self._getBatchPayloads(cls, missing)
+            if missing and payloads is None:
+                pool = ThreadPool(min(maxWorkers, len(missing)))
+                try:
+                    payloads = pool.map(lambda _id: self._getPayload(cls, _id),
+                                        missing)
+                finally:
+                    pool.close()
+                    pool.join()
+            for payload in payloads or []:
+                if payload:
+                    element = self._hydrate(cls, payload)
+                    found[unicode(element.getId())] = element
+            for _id in window:
+                yield found.get(unicode(_id))
+
+    def getVerticesByIds(self, ids, maxWorkers=8):
+        """Retrieves several vertices at once, through the batch extension
+        when the server provides it or with concurrent requests otherwise
+        @params ids: The vertex identifiers
+        @params maxWorkers: Maximum number of concurrent requests
+
+        @returns A generator over the vertices in the order of ids, with
+        None for the ones that do not exist"""
+        return self._getElementsByIds(Vertex, ids, maxWorkers)
+
+    def getVertices(self, pageSize=None, lazy=False):
+        """Returns an iterator with all the vertices
+        @params pageSize: Optional number of vertices requested at once
+        @params lazy: Whether to return LazyVertex handles instead
+
+        @returns A generator function over all the vertices"""
         url = "%s/vertices" % self.url
-        r = requests.get(url)
-        for vertex in simplejson.loads(r.content)['results']:
-            yield Vertex(self, vertex.get('_id'))
+        for vertex in self._iterResults(url, pageSize=pageSize):
+            if lazy:
+                yield LazyVertex.from_payload(self, vertex)
+            else:
+                yield self._hydrate(Vertex, vertex)
+
+    def getVertexHandle(self, _id):
+        """Returns a handle of the vertex with the given id without
+        requesting it; its properties are loaded on the first access
+        @params _id: Vertex unique identifier
+
+        @returns The LazyVertex"""
+        return LazyVertex(self, _id)
 
     def removeVertex(self, vertex):
         """Removes the given vertex
         @params vertex: Node to be removed"""
         _id = vertex.getId()
         url = "%s/vertices/%s" % (self.url, _id)
-        r = requests.delete(url)
+        r = self.server._request('delete', url)
         if r.error:
             raise RexsterException("Could not delete vertex")
+        self._elementRemoved(Vertex, _id)
 
-    def addEdge(self, outV, inV, label):
+    def addEdge(self, outV, inV, label, properties=None):
         """Creates a new edge
-        @params outVertex: Edge origin Vertex
-        @params inVertex: Edge target vertex
+        @params outVertex: Edge origin Vertex or its identifier
+        @params inVertex: Edge target vertex or its identifier
         @params label: Edge label
+        @params properties: Optional dictionary of edge properties
 
         @returns The created Edge object"""
+        outV = _elementId(outV)
+        inV = _elementId(inV)
         url = "%s/edges?_outV=%s&_inV=%s&_label=%s" % (self.url,
-                                                    outV.getId(),
-                                                    inV.getId(),
+                                                    outV,
+                                                    inV,
                                                     label)
-        data = dict(_outV=outV.getId(),
-                    _inV=inV.getId(),
+        data = dict(properties or {})
+        data.update(_outV=outV,
+                    _inV=inV,
                     _label=label)
-        r = requests.post(url, data=data)
+        r = self.server._request('post', url, data=data)
         if r.error:
             raise RexsterException("Could not create the edge")
-        properties = simplejson.loads(r.content)['results']
-        return Edge(self, properties['_id'])
+        properties = self.server._decode(r)['results']
+        return self._hydrate(Edge, properties)
+
+    def getEdges(self, pageSize=None, lazy=False):
+        """Returns an iterator with all the edges
+        @params pageSize: Optional number of edges requested at once
+        @params lazy: Whether to return LazyEdge handles instead
 
-    def getEdges(self):
-        """Returns an iterator with all the edges"""
+        @returns A generator function over all the edges"""
         url = "%s/edges" % self.url
-        r = requests.get(url)
-        content = simplejson.loads(r.content)
-        if r.error:
-            raise RexsterException(content['message'])
-        else:
-            for edge in content['results']:
-                yield Edge(self, edge.get('_id'))
+        for edge in self._iterResults(url, pageSize=pageSize):
+            if lazy:
+                yield LazyEdge.from_payload(self, edge)
+            else:
+                yield self._hydrate(Edge, edge)
+
+    def getEdgeHandle(self, _id):
+        """Returns a handle of the edge with the given id without
+        requesting it; its properties are loaded on the first access
+        @params _id: Edge unique identifier
+
+        @returns The LazyEdge"""
+        return LazyEdge(self, _id)
+
+    def getEdgesByIds(self, ids, maxWorkers=8):
+        """Retrieves several edges at once, through the batch extension
+        when the server provides it or with concurrent requests otherwise
+        @params ids: The edge identifiers
+        @params maxWorkers: Maximum number of concurrent requests
+
+        @returns A generator over the edges in the order of ids, with
+        None for the ones that do not exist"""
+        return self._getElementsByIds(Edge, ids, maxWorkers)
+
+    def hasEdge(self, _id):
+        """Checks whether an edge exists without retrieving it
+        @params _id: Edge unique identifier
+
+        @returns True if the edge exists"""
+        return self._exists(Edge, _id)
+
+    def countEdges(self):
+        """Returns the number of edges of the graph, counted in the
+        server with Gremlin when available
+
+        @returns The number of edges"""
+        return self._countElements('edges')
 
     def getEdge(self, _id):
         """Retrieves an existing edge from the graph
@@ -305,7 +1113,7 @@ class RexsterGraph(object):
 
         @returns The requested Edge"""
         try:
-            return Edge(self, _id)
+            return self._getElement(Edge, _id)
         except RexsterException:
             return None
 
@@ -314,24 +1122,133 @@ class RexsterGraph(object):
         @params edge: The edge to be removed"""
         _id = edge.getId()
         url = "%s/edges/%s" % (self.url, _id)
-        r = requests.delete(url)
+        r = self.server._request('delete', url)
         if r.error:
             raise RexsterException("Could not delete edge")
-
-    def gremlin_execute(self, gremlin_script):
+        self._elementRemoved(Edge, _id)
+
+    def batch(self, chunkSize=1000, failFast=True):
+        """Returns a Batch that queues vertex, edge, property and index
+        changes and sends them in chunks through the batch extension
+        when it is committed. It is committed at the end of a with block
+        @params chunkSize: Number of changes sent in each request
+        @params failFast: Whether a failed chunk raises a RexsterException
+        or is only recorded in the errors of the batch
+
+        @returns The Batch object"""
+        return Batch(self, chunkSize, failFast)
+
+    def writeBehind(self, maxPending=1000, maxDelay=None, failFast=True):
+        """Starts buffering the property changes of the vertices and
+        edges of the graph, sending the changes to each element merged
+        into as few requests as possible when the buffer is flushed. Use
+        it as a context manager to flush and stop buffering at exit
+        @params maxPending: Number of elements with pending changes that
+        triggers a flush
+        @params maxDelay: Optional seconds after which pending changes are
+        flushed in the background
+        @params failFast: Whether a flush raises a RexsterException when
+        a write fails, which is only recorded in errors otherwise
+
+        @returns The WriteBehind buffer"""
+        if self._writeBehind is not None:
+            self._writeBehind.close()
+        self._writeBehind = WriteBehind(self, maxPending, maxDelay, failFast)
+        return self._writeBehind
+
+    def flush(self):
+        """Sends the property changes buffered since writeBehind()
+
+        @returns The list of the writes that failed"""
+        if self._writeBehind is None:
+            return []
+        return self._writeBehind.flush()
+
+    def gremlin_execute(self, gremlin_script, params=None, stream=False,
+                        readOnly=None):
+        """Executes a Gremlin script in the server
+        @params gremlin_script: The script to execute
+        @params params: Optional dictionary of values bound to the script
+        variables of the same name. Binding values instead of formatting
+        them into the script keeps its text constant, so the server
+        compiles it only once
+        @params stream: Whether to decode the results while the response
+        is being read
+        @params readOnly: Whether the script only reads the graph, so a
+        RexsterCluster may send it to a replica; None guesses it from the
+        steps of the script
+
+        @returns The response content, or a generator over its results
+        when stream is True"""
         url = '%s/tp/gremlin' % (self.url)
-        r = requests.post(url, data={'script':gremlin_script})
+        if params:
+            kwargs = {'data': simplejson.dumps({'script': gremlin_script,
+                                                'params': params}),
+                    'headers': {'Content-Type': 'application/json'}}
+        else:
+            kwargs = {'data': {'script': gremlin_script}}
+        if stream:
+            return self._streamResults('post', url, readOnly=readOnly,
+                                        **kwargs)
+        r = self.server._request('post', url, readOnly=readOnly, **kwargs)
         if r.content:
-            content = simplejson.loads(r.content)
+            content = self.server._decode(r)
 
         if r.error:
             raise RexsterException(content['message'])
         elif content:
             return content
 
+    def traverse(self, _id=None):
+        """Starts a traversal at the given vertex or, if None, at all
+        the vertices. Its steps are executed together as a single
+        Gremlin script in the server
+        @params _id: Optional identifier of the start vertex
+
+        @returns A Traversal object"""
+        return Traversal(self, _id)
+
+    def to_csr(self, vertexProperties=None, edgeProperties=None,
+                pageSize=None):
+        """Exports the adjacency of the graph to compressed sparse row
+        NumPy arrays, listing the vertices and the edges once. Requires
+        numpy
+        @params vertexProperties: Optional vertex property keys exported
+        as columns
+        @params edgeProperties: Optional edge property keys exported as
+        columns
+        @params pageSize: Optional number of elements requested at once
+
+        @returns A rexster.export.CSRGraph"""
+        from rexster.export import CSRGraph
+        return CSRGraph.from_graph(self, vertexProperties, edgeProperties,
+                                    pageSize)
+
+    def registerScript(self, name, gremlin_script):
+        """Declares a named Gremlin script, whose variables are bound
+        when it is executed with executeScript
+        @params name: The script name
+        @params gremlin_script: The script text"""
+        self.scripts[name] = gremlin_script
+
+    def executeScript(self, name, params=None, stream=False, readOnly=None):
+        """Executes a script declared with registerScript
+        @params name: The script name
+        @params params: Optional dictionary of values bound to the script
+        @params stream: Whether to decode the results while the response
+        is being read
+        @params readOnly: Whether the script only reads the graph
+
+        @returns The same as gremlin_execute"""
+        try:
+            gremlin_script = self.scripts[name]
+        except KeyError:
+            raise RexsterException("Unknown script %s" % name)
+        return self.gremlin_execute(gremlin_script, params, stream, readOnly)
+
     # attention: gremlin must be enabled        
     def shortest_path(self, start, end):
-        if type(start) != Vertex or type(end) != Vertex:
+        if _indexClass(start) != 'vertex' or _indexClass(end) != 'vertex':
             raise RexsterException("both start and end must be valid vertices!")
 
         #gremlin_script = 'g = rexster.getGraph("%s")' % self.name
@@ -343,11 +1260,12 @@ class RexsterGraph(object):
 #        gremlin_script = 'dsp.getPath(g.v(%d),g.v(%d))' % (start.getId(), end.getId())
 #        gremlin_result = self.gremlin_execute(gremlin_script)['results']
 
-        gremlin_script = '(new edu.uci.ics.jung.algorithms.shortestpath.DijkstraShortestPath(new GraphJung(g))).getPath(g.v(%d),g.v(%d))' % (start.getId(), end.getId())
-        gremlin_result = self.gremlin_execute(gremlin_script)['results']
+        params = {'start': start.getId(), 'end': end.getId()}
+        gremlin_result = self.gremlin_execute(SHORTEST_PATH_SCRIPT,
+                                            params, readOnly=True)['results']
 
         for edge in gremlin_result:
-            yield Edge(self, edge.get('_id'))
+            yield self._hydrate(Edge, edge)
 
 class Index(object):
     """An class containing all the methods needed by an
@@ -374,10 +1292,13 @@ class Index(object):
         @params outVertex: Index value string
 
         @returns The number of elements indexed"""
+        ids = self._lookup(key, value)
+        if ids is not None:
+            return len(ids)
         url = "%s/count" % self.url
-        r = requests.get(url, params={'key': key,
-                                    'value': value})
-        content = simplejson.loads(r.content)
+        r = self.graph.server._request('get', url,
+                                        params={'key': key, 'value': value})
+        content = self.graph.server._decode(r)
         if r.error:
             raise RexsterException(content['message'])
         return content['totalSize']
@@ -405,56 +1326,117 @@ class Index(object):
         key-value pair
         @params key: Index key string
         @params value: Index value string
-        @params element: Vertex or Edge element to be indexed"""
-        if isinstance(element, Vertex):
-            klass = 'vertex'
-        elif isinstance(element, Edge):
-            klass = 'edge'
-        else:
+        @params element: Vertex or Edge element, or handle, to be
+        indexed"""
+        klass = _indexClass(element)
+        if klass is None:
             raise RexsterException("Unknown element type")
+        self._put(key, value, klass, element.getId())
+
+    def _put(self, key, value, klass, _id):
         data = {'key': key,
                 'value': value,
                 'class': klass,
-                'id': element.getId()}
-        r = requests.post(self.url, data)
+                'id': _id}
+        r = self.graph.server._request('post', self.url, data=data)
         if r.error:
-            error_msg = simplejson.loads(r.content)['message']
+            error_msg = self.graph.server._decode(r)['message']
             raise RexsterException(error_msg)
+        self.graph._indexChanged(self.indexName, key, value)
+
+    def _lookup(self, key, value):
+        """Returns the cached element ids of a key-value pair or None"""
+        if self.graph.indexCache is not None:
+            entry = self.graph.indexCache.get((self.indexName, key,
+                                            unicode(value)))
+            if entry is not None:
+                return entry[1]
 
-    def get(self, key, value):
+    def get(self, key, value, pageSize=None):
         """Gets an element from an index under a given
-        key-value pair
+        key-value pair. When the graph has an index cache, the ids of
+        the elements are kept and only the elements are requested on
+        the next lookups of the pair
         @params key: Index key string
         @params value: Index value string
+        @params pageSize: Optional number of elements requested at once
         @returns A generator of Vertex or Edge objects"""
-        r = requests.get(self.url, params={'key': key,
-                                        'value': value})
-        content = simplejson.loads(r.content)
-        if r.error:
-            raise RexsterException(content['message'])
-        for item in content['results']:
-            if self.indexClass in ('vertex', 'neo4jvertex'):
-                yield Vertex(self.graph, item.get('_id'))
-            else:
-                yield Edge(self.graph, item.get('_id'))
+        ids = self._lookup(key, value)
+        if ids is None:
+            return self._get(key, value, pageSize)
+        if self.indexClass in ('vertex', 'neo4jvertex'):
+            elements = self.graph.getVerticesByIds(ids)
+        else:
+            elements = self.graph.getEdgesByIds(ids)
+        return (element for element in elements if element is not None)
+
+    def _get(self, key, value, pageSize):
+        params = {'key': key, 'value': value}
+        if self.indexClass in ('vertex', 'neo4jvertex'):
+            cls = Vertex
+        else:
+            cls = Edge
+        ids = []
+        for item in self.graph._iterResults(self.url, params, pageSize):
+            element = self.graph._hydrate(cls, item)
+            ids.append(unicode(element.getId()))
+            yield element
+        if self.graph.indexCache is not None:
+            # Kept with the type of the elements, for the removals to
+            # drop the lookups listing them
+            self.graph.indexCache.put((self.indexName, key, unicode(value)),
+                                    (cls._resource, ids))
+
+    def _map(self, function, pairs, maxWorkers):
+        pairs = [tuple(pair) for pair in pairs]
+        if not pairs:
+            return {}
+        pool = ThreadPool(min(maxWorkers, len(pairs)))
+        try:
+            results = pool.map(lambda pair: function(*pair), pairs)
+        finally:
+            pool.close()
+            pool.join()
+        return dict(zip(pairs, results))
+
+    def get_many(self, pairs, pageSize=None, maxWorkers=8):
+        """Gets the elements indexed under several key-value pairs,
+        looking them up concurrently
+        @params pairs: The (key, value) pairs
+        @params pageSize: Optional number of elements requested at once
+        @params maxWorkers: Maximum number of concurrent lookups
+
+        @returns A dictionary with the list of Vertex or Edge objects of
+        every (key, value) pair"""
+        return self._map(lambda key, value: list(self.get(key, value,
+                                                        pageSize)),
+                        pairs, maxWorkers)
+
+    def count_many(self, pairs, maxWorkers=8):
+        """Returns the number of elements indexed under several
+        key-value pairs, counting them concurrently
+        @params pairs: The (key, value) pairs
+        @params maxWorkers: Maximum number of concurrent requests
+
+        @returns A dictionary with the count of every (key, value) pair"""
+        return self._map(self.count, pairs, maxWorkers)
 
     def remove(self, key, value, element):
         """Removes an element from an index under a given
         key-value pair
         @params key: Index key string
         @params value: Index value string
-        @params element: Vertex or Edge element to be removed"""
-        if isinstance(element, Vertex):
-            klass = 'vertex'
-        elif isinstance(element, Edge):
-            klass = 'edge'
-        else:
+        @params element: Vertex or Edge element, or handle, to be
+        removed"""
+        klass = _indexClass(element)
+        if klass is None:
             raise RexsterException("Unknown element to be deleted")
         _id = element.getId()
         data = {'class': klass, 'key': key, 'value': value, 'id': _id}
-        r = requests.delete(self.url, params=data)
+        r = self.graph.server._request('delete', self.url, params=data)
         if r.error:
             raise RexsterException("Could not delete element")
+        self.graph._indexChanged(self.indexName, key, value)
 
     def __str__(self):
         return "Index %s (%s, %s)" % (self.indexName,
@@ -466,8 +1448,8 @@ class AutomaticIndex(Index):
 
     def getAutoIndexKeys(self):
         url = "%s/keys" % self.url
-        r = requests.get(url)
-        content = simplejson.loads(r.content)
+        r = self.graph.server._request('get', url)
+        content = self.graph.server._decode(r)
         if r.error:
             raise RexsterException(content['message'])
         return content['results']
@@ -476,6 +1458,35 @@ class AutomaticIndex(Index):
 class RexsterIndexableGraph(RexsterGraph):
     """An class containing the specific methods
     for indexable graphs"""
+    # The index descriptions by name, None until they are requested
+    _catalog = None
+
+    def refresh(self):
+        """Drops the cached graph metadata and index catalog, which are
+        requested again on their next use"""
+        super(RexsterIndexableGraph, self).refresh()
+        self._catalog = None
+
+    def _getCatalog(self):
+        if self._catalog is None:
+            url = "%s/indices" % self.url
+            r = self.server._request('get', url)
+            content = self.server._decode(r)
+            if r.error:
+                raise RexsterException(content['message'])
+            self._catalog = dict((index['name'], index)
+                                for index in content['results'])
+        return self._catalog
+
+    def _catalogIndex(self, content):
+        if self._catalog is not None:
+            self._catalog[content['name']] = content
+        if content['type'] == 'automatic':
+            return AutomaticIndex(self, content['name'],
+                                content['class'], content['type'])
+        else:
+            return Index(self, content['name'], content['class'],
+                        content['type'])
 
     def __createIndex(self, indexName, indexClass, indexType, autoKeys=[]):
         indexClass = indexClass.lower()
@@ -486,8 +1497,8 @@ class RexsterIndexableGraph(RexsterGraph):
         data = {'class': indexClass, 'type': indexType}
         if indexType == 'automatic':
             data['keys'] = autoKeys
-        r = requests.post(url, data=data)
-        content = simplejson.loads(r.content)
+        r = self.server._request('post', url, data=data)
+        content = self.server._decode(r)
         if r.error:
             raise RexsterException(content['message'])
         return content['results']
@@ -499,7 +1510,7 @@ class RexsterIndexableGraph(RexsterGraph):
 
         @returns The created Index"""
         content = self.__createIndex(indexName, indexClass, 'manual')
-        return Index(self, content['name'], content['class'], content['type'])
+        return self._catalogIndex(content)
 
     def createAutomaticIndex(self, indexName, indexClass, autoKeys=[]):
         """Creates an automatic index
@@ -510,20 +1521,16 @@ class RexsterIndexableGraph(RexsterGraph):
         @returns The created AutomaticIndex"""
         content = self.__createIndex(indexName, indexClass, 'automatic',
                                     autoKeys)
-        return AutomaticIndex(self, content['name'], content['class'],
-                            content['type'])
+        return self._catalogIndex(content)
 
     def getIndices(self):
-        """Returns a generator function over all the existing indexes
+        """Returns a generator function over all the existing indexes,
+        from the index catalog requested on the first call and after
+        refresh()
 
         @returns A generator function over all rhe Index objects"""
-        url = "%s/indices" % self.url
-        r = requests.get(url)
-        content = simplejson.loads(r.content)
-        if r.error:
-            raise RexsterException(content['message'])
-        for index in content['results']:
-            yield Index(self, index['name'], index['class'], index['type'])
+        for content in self._getCatalog().values():
+            yield self._catalogIndex(content)
 
     def getIndex(self, indexName, indexClass=None):
         """Retrieves an index with a given index name and class
@@ -531,24 +1538,40 @@ class RexsterIndexableGraph(RexsterGraph):
         @params indexClass: VERTICES or EDGES
 
         @return The Index object or None"""
+        content = self._getCatalog().get(indexName)
+        if content is not None:
+            return self._catalogIndex(content)
+        # The index may have been created by another client
         url = "%s/indices/%s" % (self.url, indexName)
-        r = requests.get(url)
-        #rexster 0.4 content = simplejson.loads(r.content)
-        content = simplejson.loads(r.content)['results'] #rexster 0.5
-        if r.error:
+        r = self.server._request('get', url)
+        if not r.ok:
             return None
-        if content['type'] == 'automatic':
-            return AutomaticIndex(self, content['name'],
-                                content['class'], content['type'])
-        else:
-            return Index(self, content['name'], content['class'],
-                        content['type'])
+        #rexster 0.4 content = simplejson.loads(r.content)
+        content = self.server._decode(r)['results'] #rexster 0.5
+        return self._catalogIndex(content)
 
     def dropIndex(self, indexName):
         """Removes an index with a given indexName
         @params indexName: The index name"""
         url = "%s/indices/%s" % (self.url, indexName)
-        r = requests.delete(url)
+        r = self.server._request('delete', url)
         if r.error:
-            content = simplejson.loads(r.content)
+            content = self.server._decode(r)
             raise RexsterException(content['message'])
+        self._indexChanged(indexName, removed=True)
+        if self._catalog is not None:
+            self._catalog.pop(indexName, None)
+
+    def _invalidate(self, message):
+        super(RexsterIndexableGraph, self)._invalidate(message)
+        if message.get('resource') == 'indices' and message.get('removed') \
+                and message.get('origin') != self._origin and \
+                self._catalog is not None:
+            self._catalog.pop(message.get('id'), None)
+
+
+from rexster.batch import Batch
+from rexster.cluster import RexsterCluster
+from rexster.lazy import LazyEdge, LazyVertex
+from rexster.traversal import Traversal
+from rexster.writebehind import WriteBehind
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Graph algorithms run in process over an adjacency snapshot.
+
+The snapshot lists the vertices and edges of a graph once and keeps
+them as compressed sparse rows (arrays of neighbour indices per vertex),
+so searches do not request the server nor need Gremlin. Vertices whose
+edges changed can be requested again with refresh(ids), which overlays
+their new rows on the arrays without listing the whole graph."""
+
+import heapq
+import time
+from array import array
+
+from rexster import BOTH, IN, OUT, RexsterException
+
+_REVERSE = {OUT: IN, IN: OUT, BOTH: BOTH}
+
+
+class _Rows(object):
+    """Compressed sparse rows: the neighbours of vertex i are the
+    entries between indptr[i] and indptr[i + 1]"""
+
+    def __init__(self, size, entries):
+        """@params size: Number of vertices
+        @params entries: (source, target, weight, edge id) tuples"""
+        indptr = array('l', [0]) * (size + 1)
+        for entry in entries:
+            indptr[entry[0] + 1] += 1
+        for i in xrange(size):
+            indptr[i + 1] += indptr[i]
+        positions = indptr[:-1]
+        self.indptr = indptr
+        self.indices = array('l', [0]) * len(entries)
+        self.weights = array('d', [0.0]) * len(entries)
+        self.edges = [None] * len(entries)
+        for source, target, weight, edge in entries:
+            position = positions[source]
+            positions[source] += 1
+            self.indices[position] = target
+            self.weights[position] = weight
+            self.edges[position] = edge
+
+    def row(self, index):
+        if index + 1 >= len(self.indptr):
+            return []
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return zip(self.indices[start:end], self.weights[start:end],
+                    self.edges[start:end])
+
+
+class AdjacencySnapshot(object):
+    """An in-memory copy of the adjacency of a graph"""
+
+    def __init__(self, graph, label=None, weightKey=None, pageSize=None):
+        """Lists the vertices and edges of the graph
+        @params graph: The RexsterGraph to copy
+        @params label: Optional label of the only edges kept
+        @params weightKey: Optional edge property used as weight by
+        dijkstra(), 1.0 when missing
+        @params pageSize: Optional number of elements requested at once"""
+        self.graph = graph
+        self.label = label
+        self.weightKey = weightKey
+        self.pageSize = pageSize
+        self.refresh()
+
+    def _index(self, _id):
+        _id = unicode(_id)
+        index = self._indices.get(_id)
+        if index is None:
+            index = self._indices[_id] = len(self._ids)
+            self._ids.append(_id)
+        return index
+
+    def _weight(self, edge):
+        if self.weightKey is None:
+            return 1.0
+        value = edge.properties.get(self.weightKey)
+        return 1.0 if value is None else float(value)
+
+    def _entry(self, edge):
+        return (self._index(edge.properties.get('_outV')),
+                self._index(edge.properties.get('_inV')),
+                self._weight(edge), edge.getId())
+
+    def refresh(self, ids=None):
+        """Brings the snapshot up to date
+        @params ids: Optional identifiers of the only vertices whose
+        edges are requested again; the whole graph is listed again
+        when omitted"""
+        if ids is None:
+            self._indices = {}
+            self._ids = []
+            self._removed = set()
+            self._overlay = {OUT: {}, IN: {}}
+            for vertex in self.graph.getVertices(self.pageSize, lazy=True):
+                self._index(vertex.getId())
+            entries = [self._entry(edge)
+                        for edge in self.graph.getEdges(self.pageSize)
+                        if self.label is None or edge.getLabel() == self.label]
+            size = len(self._ids)
+            self._rows = {OUT: _Rows(size, entries),
+                            IN: _Rows(size, [(target, source, weight, edge)
+                                for source, target, weight, edge in entries])}
+        else:
+            for _id in ids:
+                self._refreshVertex(_id)
+        self.loadedAt = time.time()
+
+    def _refreshVertex(self, _id):
+        index = self._index(_id)
+        vertex = self.graph.getVertex(_id)
+        rows = {OUT: [], IN: []}
+        if vertex is None:
+            self._removed.add(index)
+        else:
+            self._removed.discard(index)
+            for edge in vertex.getBothEdges(self.label, self.pageSize):
+                source, target, weight, edgeId = self._entry(edge)
+                if source == index:
+                    rows[OUT].append((target, weight, edgeId))
+                if target == index:
+                    rows[IN].append((source, weight, edgeId))
+        for direction in (OUT, IN):
+            opposite = _REVERSE[direction]
+            old = self._neighbors(index, direction)
+            new = rows[direction]
+            self._overlay[direction][index] = new
+            for neighbor in set(entry[0] for entry in old + new):
+                row = [entry for entry in self._neighbors(neighbor, opposite)
+                        if entry[0] != index]
+                row.extend((index, weight, edgeId)
+                            for target, weight, edgeId in new
+                            if target == neighbor)
+                self._overlay[opposite][neighbor] = row
+
+    def _neighbors(self, index, direction):
+        if direction == BOTH:
+            return self._neighbors(index, OUT) + self._neighbors(index, IN)
+        row = self._overlay[direction].get(index)
+        if row is None:
+            row = self._rows[direction].row(index)
+        return row
+
+    def _vertex(self, _id):
+        index = self._indices.get(unicode(_id))
+        if index is None or index in self._removed:
+            raise RexsterException("Vertex %s is not in the snapshot" % _id)
+        return index
+
+    def _direction(self, direction):
+        if direction not in _REVERSE:
+            raise RexsterException("%s is not a valid direction" % direction)
+        return direction
+
+    def neighbors(self, _id, direction=OUT):
+        """Returns the identifiers of the adjacent vertices
+        @params _id: The vertex identifier
+        @params direction: OUT, IN or BOTH
+
+        @returns A list of vertex identifiers"""
+        direction = self._direction(direction)
+        return [self._ids[entry[0]]
+                for entry in self._neighbors(self._vertex(_id), direction)]
+
+    def bfs(self, start, direction=OUT, maxDepth=None):
+        """Visits the vertices reachable from start in breadth first order
+        @params start: The identifier of the start vertex
+        @params direction: OUT, IN or BOTH
+        @params maxDepth: Optional maximum number of hops
+
+        @returns A generator of (vertex identifier, depth) tuples"""
+        direction = self._direction(direction)
+        index = self._vertex(start)
+        seen = set([index])
+        frontier = [index]
+        depth = 0
+        yield self._ids[index], depth
+        while frontier and (maxDepth is None or depth < maxDepth):
+            depth += 1
+            following = []
+            for current in frontier:
+                for entry in self._neighbors(current, direction):
+                    neighbor = entry[0]
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        following.append(neighbor)
+                        yield self._ids[neighbor], depth
+            frontier = following
+
+    def kHop(self, start, k, direction=BOTH):
+        """Returns the vertices at most k hops away from start
+        @params start: The identifier of the start vertex
+        @params k: Maximum number of hops
+        @params direction: OUT, IN or BOTH
+
+        @returns A set of vertex identifiers, without start"""
+        return set(_id for _id, depth in self.bfs(start, direction, k)
+                    if depth > 0)
+
+    def _expand(self, frontier, direction, visited, others):
+        following = []
+        for current in frontier:
+            for entry in self._neighbors(current, direction):
+                neighbor = entry[0]
+                if neighbor not in visited:
+                    visited[neighbor] = current
+                    if neighbor in others:
+                        return following, neighbor
+                    following.append(neighbor)
+        return following, None
+
+    def shortestPath(self, start, end, direction=OUT):
+        """Finds a path with the fewest hops with a bidirectional
+        breadth first search
+        @params start: The identifier of the start vertex
+        @params end: The identifier of the end vertex
+        @params direction: OUT, IN or BOTH
+
+        @returns The list of vertex identifiers of the path, or None when
+        end is not reachable"""
+        direction = self._direction(direction)
+        source, target = self._vertex(start), self._vertex(end)
+        parents = {source: None}
+        children = {target: None}
+        forward, backward = [source], [target]
+        meet = source if source == target else None
+        while meet is None and forward and backward:
+            if len(forward) <= len(backward):
+                forward, meet = self._expand(forward, direction,
+                                            parents, children)
+            else:
+                backward, meet = self._expand(backward, _REVERSE[direction],
+                                            children, parents)
+        if meet is None:
+            return None
+        return self._path(meet, parents, children)
+
+    def _path(self, meet, parents, children=None):
+        path = []
+        node = meet
+        while node is not None:
+            path.append(node)
+            node = parents[node]
+        path.reverse()
+        if children is not None:
+            node = children[meet]
+            while node is not None:
+                path.append(node)
+                node = children[node]
+        return [self._ids[index] for index in path]
+
+    def dijkstra(self, start, end=None, direction=OUT):
+        """Computes the lightest paths from start, weighting the edges
+        with the weightKey property
+        @params start: The identifier of the start vertex
+        @params end: Optional identifier of the end vertex
+        @params direction: OUT, IN or BOTH
+
+        @returns A (distance, list of vertex identifiers) tuple for the
+        path to end, or None when it is not reachable. Without end, a
+        dictionary with the distance to every reachable vertex"""
+        direction = self._direction(direction)
+        source = self._vertex(start)
+        target = None if end is None else self._vertex(end)
+        distances = {source: 0.0}
+        parents = {source: None}
+        done = set()
+        heap = [(0.0, source)]
+        while heap:
+            distance, current = heapq.heappop(heap)
+            if current in done:
+                continue
+            done.add(current)
+            if current == target:
+                return distance, self._path(current, parents)
+            for neighbor, weight, edgeId in self._neighbors(current,
+                                                            direction):
+                if weight < 0:
+                    raise RexsterException("Edge %s has a negative weight"
+                                            % edgeId)
+                candidate = distance + weight
+                if neighbor not in distances or \
+                        candidate < distances[neighbor]:
+                    distances[neighbor] = candidate
+                    parents[neighbor] = current
+                    heapq.heappush(heap, (candidate, neighbor))
+        if target is not None:
+            return None
+        return dict((self._ids[index], distance)
+                    for index, distance in distances.iteritems())
+
+    def __len__(self):
+        return len(self._ids) - len(self._removed)
+
+    def __contains__(self, _id):
+        index = self._indices.get(unicode(_id))
+        return index is not None and index not in self._removed
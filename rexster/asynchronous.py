@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Asynchronous variant of the Rexster client built on gevent.
+
+Every method of the asynchronous server, graphs, elements and indices
+is the method of the same name of the blocking classes, run in a
+greenlet of a bounded pool shared by the server. It returns an AsyncCall
+right away: its get() waits for the result, and iterating over it
+yields the elements of listing methods as they are received. The
+accessors reading what the object already holds, such as getId() or
+getLabel(), return their value directly, so it can be passed back to the
+client.
+
+Requests only cooperate with other greenlets when the socket module is
+patched by gevent, so the program must call gevent.monkey.patch_all()
+(or at least patch_socket()) before creating an AsyncRexsterServer."""
+
+import types
+
+try:
+    import gevent
+    import gevent.monkey
+    import gevent.pool
+    import gevent.queue
+except ImportError:
+    raise ImportError("The asynchronous client requires gevent")
+
+from rexster import (Index, RexsterException, RexsterGraph,
+                    RexsterIndexableGraph, RexsterServer, _indexClass)
+
+
+# Number of listing results received ahead of the consumer
+QUEUE_SIZE = 1000
+
+
+class _End(object):
+    """Marks the end of a listing, with the error that ended it"""
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+class AsyncCall(object):
+    """The result of an asynchronous method call"""
+
+    def __init__(self, server, function, args, kwargs):
+        self.server = server
+        self.greenlet = server.pool.spawn(function, *args, **kwargs)
+
+    def ready(self):
+        """Returns whether the call has finished"""
+        return self.greenlet.ready()
+
+    def successful(self):
+        """Returns whether the call has finished without errors"""
+        return self.greenlet.successful()
+
+    def get(self, timeout=None):
+        """Waits for the call to finish
+
+        @returns The result, or an iterator over the asynchronous
+        elements when the method is a listing method"""
+        result = self.greenlet.get(timeout=timeout)
+        if isinstance(result, types.GeneratorType):
+            return self._iterate(result)
+        return _wrap(self.server, result)
+
+    def _iterate(self, generator):
+        queue = gevent.queue.Queue(QUEUE_SIZE)
+
+        def produce():
+            try:
+                for item in generator:
+                    queue.put(_wrap(self.server, item))
+            except BaseException as e:
+                queue.put(_End(e))
+            else:
+                queue.put(_End())
+
+        producer = gevent.spawn(produce)
+        try:
+            while True:
+                item = queue.get()
+                if isinstance(item, _End):
+                    if item.error is not None:
+                        raise item.error
+                    return
+                yield item
+        finally:
+            producer.kill()
+
+    def __iter__(self):
+        result = self.get()
+        if not hasattr(result, 'next'):
+            raise RexsterException("%r is not a listing result" % result)
+        return result
+
+
+class _AsyncObject(object):
+    """Runs the methods of a blocking object in the server greenlet
+    pool, returning an AsyncCall for each call"""
+
+    # Methods called directly, as they make no request
+    _local = frozenset()
+
+    def __init__(self, server, wrapped):
+        self._server = server
+        self._wrapped = wrapped
+
+    def __getattr__(self, name):
+        attribute = getattr(self._wrapped, name)
+        if not callable(attribute) or name in self._local:
+            return attribute
+
+        def method(*args, **kwargs):
+            args = [_unwrap(arg) for arg in args]
+            kwargs = dict((key, _unwrap(value))
+                        for key, value in kwargs.iteritems())
+            return AsyncCall(self._server, attribute, args, kwargs)
+        method.__name__ = name
+        method.__doc__ = attribute.__doc__
+        return method
+
+    def __eq__(self, other):
+        return _unwrap(self) == _unwrap(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._wrapped)
+
+    def __str__(self):
+        return str(self._wrapped)
+
+
+class AsyncVertex(_AsyncObject):
+    """Asynchronous variant of Vertex"""
+    _local = frozenset(['getId'])
+
+
+class AsyncEdge(_AsyncObject):
+    """Asynchronous variant of Edge"""
+    # The label of a LazyEdge may be requested with its endpoints
+    _local = frozenset(['getId', 'getLabel'])
+
+
+class AsyncIndex(_AsyncObject):
+    """Asynchronous variant of Index"""
+    _local = frozenset(['getIndexName', 'getIndexClass', 'getIndexType'])
+
+
+def _wrap(server, value):
+    """Wraps the vertices, edges, handles and indices of a result,
+    including the ones in its lists, tuples and dictionaries"""
+    if isinstance(value, _AsyncObject):
+        return value
+    klass = _indexClass(value)
+    if klass == 'vertex':
+        return AsyncVertex(server, value)
+    elif klass == 'edge':
+        return AsyncEdge(server, value)
+    elif isinstance(value, Index):
+        return AsyncIndex(server, value)
+    elif isinstance(value, list):
+        return [_wrap(server, item) for item in value]
+    elif isinstance(value, tuple):
+        return tuple(_wrap(server, item) for item in value)
+    elif isinstance(value, dict):
+        return dict((_wrap(server, key), _wrap(server, item))
+                    for key, item in value.iteritems())
+    return value
+
+
+def _unwrap(value):
+    if isinstance(value, _AsyncObject):
+        return value._wrapped
+    return value
+
+
+class AsyncRexsterServer(RexsterServer):
+    """A Rexster server whose graphs run their requests concurrently
+    in a pool of greenlets"""
+
+    def __init__(self, host, concurrency=1000, **options):
+        """Connects to a Rexster server
+        @params host: The server URL
+        @params concurrency: Maximum number of calls running at once
+        @params options: The connection pool options of RexsterServer"""
+        if not gevent.monkey.is_module_patched('socket'):
+            raise RexsterException("The socket module must be patched "
+                                    "with gevent.monkey.patch_socket()")
+        options.setdefault('poolMaxSize', concurrency)
+        self.pool = gevent.pool.Pool(concurrency)
+        super(AsyncRexsterServer, self).__init__(host, **options)
+
+    def spawn(self, function, *args, **kwargs):
+        """Runs any function in the greenlet pool of the server
+
+        @returns The AsyncCall of the function"""
+        return AsyncCall(self, function, args, kwargs)
+
+
+class AsyncRexsterGraph(_AsyncObject):
+    """Asynchronous variant of RexsterGraph"""
+    graphClass = RexsterGraph
+
+    def __init__(self, server, name, **options):
+        """Creates a new graph
+        @params server: The AsyncRexsterServer the graph is served by
+        @params name: The graph name
+        @params options: The options of RexsterGraph"""
+        super(AsyncRexsterGraph, self).__init__(
+            server, self.graphClass(server, name, **options))
+
+
+class AsyncRexsterIndexableGraph(AsyncRexsterGraph):
+    """Asynchronous variant of RexsterIndexableGraph"""
+    graphClass = RexsterIndexableGraph
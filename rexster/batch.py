@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import uuid
+
+import simplejson
+
+from rexster import (Edge, Element, RexsterException, Vertex, _elementId,
+                    _indexClass)
+
+
+def _elementType(element):
+    klass = _indexClass(element)
+    if klass is None:
+        raise RexsterException("Unknown element type")
+    return klass
+
+
+class Batch(object):
+    """A queue of graph changes sent in chunks to the Rexster batch
+    extension (tp/batch/tx), each chunk in one transaction. Index puts,
+    which the extension does not handle, are sent right after the
+    chunk they were queued with.
+
+    Vertices and edges are created with the identifiers given or made by
+    the batch, which are the ones returned. Graphs ignoring the supplied
+    identifiers (ignoresSuppliedIds in their features, e.g. Neo4j, OrientDB
+    or Titan) assign others that the extension does not return: addVertex
+    and addEdge then return None, the creations are not recorded in ids,
+    and the new vertices cannot be referred to in the same batch"""
+
+    def __init__(self, graph, chunkSize=1000, failFast=True):
+        """Creates a new batch
+        @params graph: The graph the changes are made to
+        @params chunkSize: Number of changes sent in each request
+        @params failFast: Whether a failed chunk raises a RexsterException
+        or is only recorded in errors"""
+        self.graph = graph
+        self.url = "%s/tp/batch/tx" % graph.url
+        self.chunkSize = chunkSize
+        self.failFast = failFast
+        self.ids = []
+        self.errors = []
+        self._operations = []
+        self._indexPuts = []
+        self._ignoresSuppliedIds = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.clear()
+        return False
+
+    def _queue(self, operation, onCommit=None):
+        self._operations.append((operation, onCommit))
+        if len(self._operations) + len(self._indexPuts) >= self.chunkSize:
+            self.flush()
+
+    def _fail(self, message, changes):
+        self.errors.append((message, changes))
+        if self.failFast:
+            raise RexsterException(message)
+
+    def ignoresSuppliedIds(self):
+        """Returns whether the graph assigns its own identifiers to the
+        vertices and edges created, from the features in its metadata"""
+        if self._ignoresSuppliedIds is None:
+            features = self.graph.getMetadata().get('features') or {}
+            self._ignoresSuppliedIds = bool(
+                features.get('ignoresSuppliedIds', False))
+        return self._ignoresSuppliedIds
+
+    def _create(self, operation, _id):
+        if _id is None:
+            _id = uuid.uuid4().hex
+        operation['_id'] = _id
+        if self.ignoresSuppliedIds():
+            # The graph creates the element with another id
+            self._queue(operation)
+            return None
+        self._queue(operation, lambda: self.ids.append(_id))
+        return _id
+
+    def _vertexId(self, vertex):
+        _id = _elementId(vertex)
+        if _id is None:
+            raise RexsterException("Vertices created by a batch on a graph "
+                                "ignoring supplied ids have no known id")
+        return _id
+
+    def addVertex(self, _id=None, properties=None):
+        """Queues the creation of a vertex
+        @params _id: Optional vertex identifier, a random one when None
+        @params properties: Optional dictionary of vertex properties
+
+        @returns The identifier the vertex is created with, or None when
+        the graph ignores supplied identifiers"""
+        operation = dict(properties or {})
+        operation.update({'_type': 'vertex', '_action': 'create'})
+        return self._create(operation, _id)
+
+    def addEdge(self, outV, inV, label, _id=None, properties=None):
+        """Queues the creation of an edge
+        @params outV: Edge origin Vertex or vertex identifier
+        @params inV: Edge target Vertex or vertex identifier
+        @params label: Edge label
+        @params _id: Optional edge identifier, a random one when None
+        @params properties: Optional dictionary of edge properties
+
+        @returns The identifier the edge is created with, or None when
+        the graph ignores supplied identifiers"""
+        operation = dict(properties or {})
+        operation.update({'_type': 'edge', '_action': 'create',
+                        '_outV': self._vertexId(outV),
+                        '_inV': self._vertexId(inV), '_label': label})
+        return self._create(operation, _id)
+
+    def setProperties(self, element, properties):
+        """Queues the update of several properties of an element
+        @params element: The Vertex or Edge to update
+        @params properties: Dictionary of the properties to set"""
+        operation = dict(properties)
+        operation.update({'_type': _elementType(element),
+                        '_action': 'update', '_id': element.getId()})
+        def onCommit():
+            if isinstance(element, Element):
+                element.properties.update(properties)
+            else:
+                # Handles request their properties again when read
+                element.invalidate()
+            self.graph._discardCopies(element)
+            self.graph._propertiesChanged(element, properties.keys())
+        self._queue(operation, onCommit)
+
+    def setProperty(self, element, key, value):
+        """Queues the update of a property of an element
+        @params element: The Vertex or Edge to update
+        @params key: The property key to set
+        @params value: The value to set"""
+        self.setProperties(element, {key: value})
+
+    def removeProperty(self, element, key):
+        """Queues the removal of a property of an element
+        @params element: The Vertex or Edge to update
+        @params key: The key of the property to remove"""
+        operation = {'_type': _elementType(element), '_action': 'delete',
+                    '_id': element.getId(), '_keys': [key]}
+        def onCommit():
+            if isinstance(element, Element):
+                element.properties.pop(key, None)
+            else:
+                element.invalidate()
+            self.graph._discardCopies(element)
+            self.graph._propertiesChanged(element, [key])
+        self._queue(operation, onCommit)
+
+    def removeVertex(self, vertex):
+        """Queues the removal of a vertex
+        @params vertex: The Vertex or vertex identifier to remove"""
+        _id = self._vertexId(vertex)
+        operation = {'_type': 'vertex', '_action': 'delete', '_id': _id}
+        self._queue(operation,
+                    lambda: self.graph._elementRemoved(Vertex, _id))
+
+    def removeEdge(self, edge):
+        """Queues the removal of an edge
+        @params edge: The Edge or edge identifier to remove"""
+        _id = _elementId(edge)
+        operation = {'_type': 'edge', '_action': 'delete', '_id': _id}
+        self._queue(operation, lambda: self.graph._elementRemoved(Edge, _id))
+
+    def put(self, index, key, value, element):
+        """Queues putting an element in an index under a given
+        key-value pair
+        @params index: The Index to update
+        @params key: Index key string
+        @params value: Index value string
+        @params element: Vertex, Edge or identifier of an element of
+        the index class"""
+        klass = _indexClass(element) or index.indexClass
+        self._indexPuts.append((index, key, value, klass,
+                                _elementId(element)))
+        if len(self._operations) + len(self._indexPuts) >= self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        """Sends the queued changes to the server"""
+        operations, self._operations = self._operations, []
+        indexPuts, self._indexPuts = self._indexPuts, []
+        if operations:
+            tx = [operation for operation, onCommit in operations]
+            r = self.graph.server._request('post', self.url,
+                                    data=simplejson.dumps({'tx': tx}),
+                                    headers={'Content-Type':
+                                            'application/json'})
+            content = self.graph.server._decode(r) if r.content else {}
+            if r.error or not content.get('success', True):
+                message = content.get('message', "Could not commit batch")
+                self._fail(message, tx + indexPuts)
+                return
+            for operation, onCommit in operations:
+                if onCommit:
+                    onCommit()
+        for index, key, value, klass, _id in indexPuts:
+            try:
+                index._put(key, value, klass, _id)
+            except RexsterException as e:
+                self._fail(str(e), [(index, key, value, klass, _id)])
+
+    def commit(self):
+        """Sends every queued change to the server
+
+        @returns The identifiers of the vertices and edges created
+        by the batch, in the order they were queued, always empty on
+        graphs ignoring supplied identifiers"""
+        self.flush()
+        return self.ids
+
+    def clear(self):
+        """Discards the queued changes"""
+        self._operations = []
+        self._indexPuts = []
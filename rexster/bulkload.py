@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Loads vertex and edge files into a Rexster graph.
+
+Vertex files are CSV files with a header row, one of whose columns holds
+the external key of the vertex, or GraphSON files with one JSON vertex
+per line. Edge files are CSV files with a header row, tab separated edge
+lists (out key, in key and an optional label per line) or GraphSON
+files with one JSON edge per line.
+
+The external keys are mapped to the identifiers Rexster assigns through
+an id map, kept on disk when a path is given so that an interrupted load
+can be resumed together with its checkpoint file. The id of a vertex is
+written to the map as soon as the vertex is created, so a vertex is only
+loaded twice when the load is interrupted between the two. The edges of
+the chunks that were being loaded when the load was interrupted may be
+loaded twice."""
+
+import argparse
+import csv
+import os
+import Queue
+import sqlite3
+import sys
+import threading
+import time
+
+import simplejson
+
+from rexster import RexsterException, RexsterIndexableGraph, RexsterServer
+
+
+FORMATS = ('csv', 'tsv', 'graphson')
+
+
+def guessFormat(path):
+    """Returns the file format for the extension of a path"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    elif extension in ('.json', '.graphson'):
+        return 'graphson'
+    return 'tsv'
+
+
+def _decode(row):
+    return [value.decode('utf-8') for value in row]
+
+
+def readVertices(path, fileFormat=None, keyColumn='id'):
+    """Yields the (key, properties) pairs of a vertex file
+    @params path: The file path
+    @params fileFormat: csv or graphson, guessed from the extension if None
+    @params keyColumn: The CSV column holding the vertex key"""
+    fileFormat = fileFormat or guessFormat(path)
+    with open(path, 'rb') as f:
+        if fileFormat == 'graphson':
+            for line in f:
+                if line.strip():
+                    properties = simplejson.loads(line)
+                    key = properties.pop('_id')
+                    properties.pop('_type', None)
+                    yield key, properties
+        elif fileFormat == 'csv':
+            reader = csv.reader(f)
+            header = _decode(reader.next())
+            for row in reader:
+                properties = dict(zip(header, _decode(row)))
+                yield properties.pop(keyColumn), properties
+        else:
+            raise RexsterException("%s is not a vertex file format"
+                                    % fileFormat)
+
+
+def readEdges(path, fileFormat=None, outColumn='out', inColumn='in',
+            labelColumn='label', defaultLabel='edge'):
+    """Yields the (out key, in key, label, properties) tuples of an
+    edge file
+    @params path: The file path
+    @params fileFormat: csv, tsv or graphson, guessed from the extension
+    if None
+    @params outColumn: The CSV column holding the origin vertex key
+    @params inColumn: The CSV column holding the target vertex key
+    @params labelColumn: The CSV column holding the edge label
+    @params defaultLabel: The label of edges that have none"""
+    fileFormat = fileFormat or guessFormat(path)
+    with open(path, 'rb') as f:
+        if fileFormat == 'graphson':
+            for line in f:
+                if line.strip():
+                    properties = simplejson.loads(line)
+                    for key in ('_id', '_type'):
+                        properties.pop(key, None)
+                    yield (properties.pop('_outV'), properties.pop('_inV'),
+                            properties.pop('_label', defaultLabel),
+                            properties)
+        elif fileFormat == 'csv':
+            reader = csv.reader(f)
+            header = _decode(reader.next())
+            for row in reader:
+                properties = dict(zip(header, _decode(row)))
+                yield (properties.pop(outColumn), properties.pop(inColumn),
+                        properties.pop(labelColumn, defaultLabel),
+                        properties)
+        elif fileFormat == 'tsv':
+            for line in f:
+                row = _decode(line.rstrip('\r\n').split('\t'))
+                if len(row) < 2 or line.startswith('#'):
+                    continue
+                label = row[2] if len(row) > 2 else defaultLabel
+                yield row[0], row[1], label, {}
+        else:
+            raise RexsterException("%s is not an edge file format"
+                                    % fileFormat)
+
+
+class IdMap(object):
+    """Maps external vertex keys to Rexster identifiers, in an SQLite
+    file when a path is given or in memory otherwise. The file is a
+    B-tree read and written a page at a time, so the memory used does
+    not grow with the number of keys. Every mapping is committed when it
+    is set, appended to the write-ahead log without waiting for the disk,
+    so it survives the process being killed"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        if path:
+            # Autocommit mode
+            self._db = sqlite3.connect(path, check_same_thread=False,
+                                    isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS ids "
+                            "(key TEXT PRIMARY KEY, id TEXT NOT NULL)")
+            self._map = None
+        else:
+            self._db = None
+            self._map = {}
+
+    def _key(self, key):
+        if isinstance(key, str):
+            return key.decode('utf-8')
+        return unicode(key)
+
+    def get(self, key):
+        """Returns the Rexster identifier of a key or None"""
+        key = self._key(key)
+        with self._lock:
+            if self._db is None:
+                try:
+                    return self._map[key]
+                except KeyError:
+                    return None
+            row = self._db.execute("SELECT id FROM ids WHERE key = ?",
+                                    (key,)).fetchone()
+        if row is not None:
+            return row[0]
+
+    def __setitem__(self, key, _id):
+        key = self._key(key)
+        with self._lock:
+            if self._db is None:
+                self._map[key] = unicode(_id)
+            else:
+                self._db.execute("INSERT OR REPLACE INTO ids VALUES (?, ?)",
+                                (key, unicode(_id)))
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            if self._db is None:
+                return len(self._map)
+            return self._db.execute("SELECT COUNT(*) FROM ids").fetchone()[0]
+
+    def sync(self):
+        """Writes the mappings to the database file, which also holds
+        them once the operating system crashes"""
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("PRAGMA wal_checkpoint")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+
+
+class BulkLoader(object):
+    """Loads vertex and edge records into a graph with a pool of worker
+    threads, holding only the chunks being loaded in memory"""
+
+    def __init__(self, graph, idMap=None, workers=4, chunkSize=500,
+                checkpoint=None, index=None, indexKeys=(), report=None,
+                reportEvery=5):
+        """Creates a new loader
+        @params graph: The RexsterGraph to load into
+        @params idMap: The IdMap of external keys, a new in-memory one
+        if None
+        @params workers: Number of parallel worker threads
+        @params chunkSize: Number of records handed to a worker at once
+        @params checkpoint: Optional path of the checkpoint file used to
+        resume an interrupted load
+        @params index: Optional Index the vertices are put in
+        @params indexKeys: The vertex properties put in index
+        @params report: File object the progress is written to, or None
+        @params reportEvery: Seconds between progress reports"""
+        self.graph = graph
+        self.idMap = idMap if idMap is not None else IdMap()
+        self.workers = workers
+        self.chunkSize = chunkSize
+        self.checkpoint = checkpoint
+        self.index = index
+        self.indexKeys = indexKeys
+        self.report = report
+        self.reportEvery = reportEvery
+        self.loaded = 0
+        self.skipped = 0
+        self._state = {}
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state = simplejson.load(f)
+            if state.get('chunkSize') != chunkSize:
+                raise RexsterException("The checkpoint was written with "
+                                        "a chunk size of %s"
+                                        % state.get('chunkSize'))
+            self._state = state['files']
+
+    def _loadVertices(self, records):
+        count = 0
+        for key, properties in records:
+            # Already loaded by an interrupted run
+            if key in self.idMap:
+                continue
+            vertex = self.graph.addVertex(properties=properties)
+            self.idMap[key] = vertex.getId()
+            for indexKey in self.indexKeys:
+                if indexKey in properties:
+                    self.index.put(indexKey, properties[indexKey], vertex)
+            count += 1
+        return count, 0
+
+    def _loadEdges(self, records):
+        count = 0
+        skipped = 0
+        for outKey, inKey, label, properties in records:
+            outV = self.idMap.get(outKey)
+            inV = self.idMap.get(inKey)
+            if outV is None or inV is None:
+                skipped += 1
+                continue
+            self.graph.addEdge(outV, inV, label, properties)
+            count += 1
+        return count, skipped
+
+    def loadVertices(self, path, records):
+        """Loads the vertex records read from a file
+        @params path: The file path, which identifies it in the checkpoint
+        @params records: The (key, properties) pairs of the file"""
+        self._run(path, records, self._loadVertices)
+
+    def loadEdges(self, path, records):
+        """Loads the edge records read from a file
+        @params path: The file path, which identifies it in the checkpoint
+        @params records: The (out key, in key, label, properties) tuples
+        of the file"""
+        self._run(path, records, self._loadEdges)
+
+    def _chunks(self, records):
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == self.chunkSize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _saveCheckpoint(self):
+        if not self.checkpoint:
+            return
+        self.idMap.sync()
+        path = "%s.tmp" % self.checkpoint
+        with open(path, 'w') as f:
+            simplejson.dump({'chunkSize': self.chunkSize,
+                            'files': self._state}, f)
+        os.rename(path, self.checkpoint)
+
+    def _reportProgress(self, path, started, force=False):
+        now = time.time()
+        if not self.report or (not force and
+                                now - self._reportedAt < self.reportEvery):
+            return
+        self._reportedAt = now
+        elapsed = max(now - started, 1e-6)
+        self.report.write("%s: %d elements loaded (%.1f elements/s)\n"
+                        % (path, self._fileLoaded, self._fileLoaded / elapsed))
+        self.report.flush()
+
+    def _run(self, path, records, loadChunk):
+        state = self._state.setdefault(path, {'done': 0, 'extra': []})
+        completed = set(state['extra'])
+        tasks = Queue.Queue(self.workers * 2)
+        results = Queue.Queue()
+        errors = []
+
+        def work():
+            while True:
+                task = tasks.get()
+                if task is None:
+                    return
+                seq, chunk = task
+                try:
+                    results.put((seq, loadChunk(chunk)))
+                except BaseException as e:
+                    errors.append(e)
+                    results.put((seq, None))
+
+        def drain(block=False):
+            while True:
+                try:
+                    seq, counts = results.get(block, 1)
+                except Queue.Empty:
+                    return
+                block = False
+                if counts is None:
+                    continue
+                self._fileLoaded += counts[0]
+                self.loaded += counts[0]
+                self.skipped += counts[1]
+                completed.add(seq)
+                while state['done'] in completed:
+                    completed.remove(state['done'])
+                    state['done'] += 1
+                state['extra'] = sorted(completed)
+                self._saveCheckpoint()
+                self._reportProgress(path, started)
+
+        started = self._reportedAt = time.time()
+        self._fileLoaded = 0
+        threads = [threading.Thread(target=work) for i in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for seq, chunk in enumerate(self._chunks(records)):
+            if errors:
+                break
+            if seq < state['done'] or seq in completed:
+                continue
+            while True:
+                try:
+                    tasks.put((seq, chunk), True, 1)
+                    break
+                except Queue.Full:
+                    drain()
+            drain()
+        for thread in threads:
+            tasks.put(None)
+        for thread in threads:
+            thread.join()
+        drain()
+        self._reportProgress(path, started, force=True)
+        if errors:
+            raise errors[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Loads vertex and edge files into a Rexster graph")
+    parser.add_argument('host', help="Rexster server URL")
+    parser.add_argument('graph', help="Graph name")
+    parser.add_argument('--vertices', action='append', default=[],
+                        metavar='FILE', help="Vertex file (csv, graphson)")
+    parser.add_argument('--edges', action='append', default=[],
+                        metavar='FILE', help="Edge file (csv, tsv, graphson)")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="File format, guessed from the extension")
+    parser.add_argument('--key-column', default='id',
+                        help="CSV column with the vertex key")
+    parser.add_argument('--out-column', default='out',
+                        help="CSV column with the edge origin key")
+    parser.add_argument('--in-column', default='in',
+                        help="CSV column with the edge target key")
+    parser.add_argument('--label-column', default='label',
+                        help="CSV column with the edge label")
+    parser.add_argument('--default-label', default='edge',
+                        help="Label of the edges without one")
+    parser.add_argument('--id-map', metavar='PATH',
+                        help="SQLite file mapping vertex keys to ids")
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help="File recording the progress to resume from")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--index', help="Manual vertex index to fill")
+    parser.add_argument('--index-key', action='append', default=[],
+                        help="Vertex property put in the index")
+    args = parser.parse_args(argv)
+    if args.checkpoint and not args.id_map:
+        parser.error("--checkpoint requires --id-map")
+
+    server = RexsterServer(args.host, poolMaxSize=args.workers)
+    graph = RexsterIndexableGraph(server, args.graph)
+    index = None
+    if args.index:
+        index = graph.getIndex(args.index)
+        if index is None:
+            parser.error("Index %s does not exist" % args.index)
+    idMap = IdMap(args.id_map)
+    loader = BulkLoader(graph, idMap, args.workers, args.chunk_size,
+                        args.checkpoint, index, args.index_key,
+                        report=sys.stderr)
+    started = time.time()
+    try:
+        for path in args.vertices:
+            loader.loadVertices(path, readVertices(path, args.format,
+                                                    args.key_column))
+        for path in args.edges:
+            loader.loadEdges(path, readEdges(path, args.format,
+                                            args.out_column, args.in_column,
+                                            args.label_column,
+                                            args.default_label))
+    finally:
+        idMap.close()
+    elapsed = max(time.time() - started, 1e-6)
+    sys.stderr.write("Loaded %d elements in %.1fs (%.1f elements/s), "
+                    "%d edges skipped\n" % (loader.loaded, elapsed,
+                                            loader.loaded / elapsed,
+                                            loader.skipped))
+
+
+if __name__ == '__main__':
+    main()
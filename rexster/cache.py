@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """A bounded mapping that evicts the least recently used
+    entries, and optionally the entries older than a given age"""
+
+    def __init__(self, maxSize=1000, ttl=None):
+        """Creates a new cache
+        @params maxSize: Maximum number of entries kept
+        @params ttl: Optional number of seconds an entry is kept"""
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, storedAt):
+        return self.ttl is not None and time.time() - storedAt > self.ttl
+
+    def get(self, key, default=None):
+        """Returns the value stored under key, marking it as the most
+        recently used, or default when missing or expired"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return default
+            if self._expired(entry[1]):
+                self.misses += 1
+                self.evictions += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key, default=None):
+        """Returns the value stored under key without updating its
+        recency nor the statistics"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[1]):
+                return default
+            return entry[0]
+
+    def put(self, key, value):
+        """Stores value under key, evicting the least recently used
+        entries beyond maxSize"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time())
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def remove(self, key):
+        """Removes the entry stored under key
+
+        @returns The removed value or None"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            return entry[0]
+
+    def removeWhere(self, predicate):
+        """Removes every entry whose (key, value) satisfies predicate"""
+        with self._lock:
+            for key, entry in self._entries.items():
+                if predicate(key, entry[0]):
+                    del self._entries[key]
+
+    def clear(self):
+        """Removes every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the usage statistics of the cache
+
+        @returns A dictionary with hits, misses, evictions and size"""
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxSize': self.maxSize}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.peek(key) is not None
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""A client of several Rexster servers in front of a shared backend.
+
+RexsterCluster is a RexsterServer whose graphs build their URLs from the
+primary host as usual. Every request is then sent to a node chosen by its
+kind: the requests changing the graph to the primary, the reads (GET and
+HEAD requests, and Gremlin scripts that only read) to the replicas, by
+least outstanding requests or weighted by their latency. Nodes failing
+repeatedly, failing a health check or slower than maxLatency are ejected
+for a while; reads fall back to the primary when no replica is left."""
+
+import random
+import re
+import threading
+import time
+
+import requests
+import simplejson
+
+from rexster import RexsterServer
+
+
+LEAST_OUTSTANDING = 'least-outstanding'
+LATENCY_WEIGHTED = 'latency-weighted'
+
+# Weight of the last response in the moving average of the latency
+LATENCY_DECAY = 0.2
+
+# Gremlin steps and Groovy constructs changing the graph; a script using
+# none of them only reads. Assignments count as changes as they may set
+# properties, which at worst sends a read to the primary
+_WRITES = re.compile(r'\b(addVertex|addEdge|removeVertex|removeEdge|'
+                    r'setProperty|removeProperty|put|remove|clear|'
+                    r'createIndex|createManualIndex|createAutomaticIndex|'
+                    r'dropIndex|createKeyIndex|dropKeyIndex|commit|'
+                    r'stopTransaction|loadGraphML|loadGraphSON)\b|'
+                    r'(?<![=!<>])=(?![=~])')
+
+
+def readOnlyScript(gremlin_script):
+    """Returns whether a Gremlin script only reads the graph, by looking
+    for the steps that change it
+    @params gremlin_script: The script
+
+    @returns True if the script can be sent to a replica"""
+    return _WRITES.search(gremlin_script) is None
+
+
+class Node(object):
+    """A Rexster server of the cluster and its request statistics"""
+
+    def __init__(self, host, primary=False):
+        self.host = host
+        self.primary = primary
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        # Moving average of the response time in seconds, None until the
+        # first response
+        self.latency = None
+        self.failures = 0
+        self.healthy = True
+        self.ejectedUntil = 0
+
+    def available(self, now):
+        return self.healthy and now >= self.ejectedUntil
+
+    def asDict(self):
+        return {'host': self.host, 'primary': self.primary,
+                'outstanding': self.outstanding, 'requests': self.requests,
+                'errors': self.errors, 'latency': self.latency,
+                'healthy': self.healthy,
+                'ejected': time.time() < self.ejectedUntil}
+
+
+class RexsterCluster(RexsterServer):
+    """A Rexster server spread over a primary and read replicas"""
+
+    def __init__(self, primary, replicas=(), balancing=LEAST_OUTSTANDING,
+                readFromPrimary=False, maxLatency=None, maxFailures=3,
+                ejectTime=30, healthInterval=None, healthTimeout=2,
+                **kwargs):
+        """Creates a client of a cluster without requesting it
+        @params primary: The URL of the server the changes are sent to
+        @params replicas: URLs of the servers the reads are spread over
+        @params balancing: LEAST_OUTSTANDING sends a read to the replica
+        with the fewest requests in progress, LATENCY_WEIGHTED picks one
+        at random with a probability inverse to its latency
+        @params readFromPrimary: Whether the primary also serves reads
+        when replicas are available
+        @params maxLatency: Optional average response time, in seconds,
+        above which a replica is ejected
+        @params maxFailures: Consecutive connection errors after which a
+        node is ejected
+        @params ejectTime: Seconds an ejected node receives no reads
+        @params healthInterval: Optional seconds between the health checks
+        made in the background, see checkHealth()
+        @params healthTimeout: Seconds a health check waits for a node
+        @params kwargs: The connection options of RexsterServer, applying
+        to every node"""
+        super(RexsterCluster, self).__init__(primary, **kwargs)
+        if balancing not in (LEAST_OUTSTANDING, LATENCY_WEIGHTED):
+            raise ValueError("%s is not a valid balancing" % balancing)
+        self.primary = Node(primary, primary=True)
+        self.replicas = [Node(host) for host in replicas]
+        for node in self.replicas:
+            self.session.poolmanager.connection_from_url(node.host)
+        self.balancing = balancing
+        self.readFromPrimary = readFromPrimary
+        self.maxLatency = maxLatency
+        self.maxFailures = maxFailures
+        self.ejectTime = ejectTime
+        self.healthTimeout = healthTimeout
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._healthThread = None
+        if healthInterval:
+            self._healthThread = threading.Thread(target=self._checkHealth,
+                                                args=(healthInterval,))
+            self._healthThread.daemon = True
+            self._healthThread.start()
+
+    @property
+    def nodes(self):
+        return [self.primary] + self.replicas
+
+    def _isRead(self, method, url, readOnly, kwargs):
+        if readOnly is not None:
+            return readOnly
+        if method.lower() in ('get', 'head'):
+            return True
+        if method.lower() == 'post' and url.endswith('/tp/gremlin'):
+            data = kwargs.get('data') or {}
+            if not isinstance(data, dict):
+                data = simplejson.loads(data)
+            return readOnlyScript(data.get('script') or '')
+        return False
+
+    def _choose(self, exclude=()):
+        """Returns the node a read is sent to"""
+        now = time.time()
+        candidates = [node for node in self.replicas
+                    if node.available(now) and node not in exclude]
+        if self.readFromPrimary or not candidates:
+            if self.primary not in exclude:
+                candidates.append(self.primary)
+        if not candidates:
+            return None
+        if self.balancing == LEAST_OUTSTANDING:
+            random.shuffle(candidates)
+            return min(candidates, key=lambda node: (node.outstanding,
+                                                    node.latency or 0))
+        known = [node.latency for node in candidates if node.latency]
+        # Nodes without measures weigh as the fastest one, to be measured
+        fastest = min(known) if known else 1.0
+        weights = [1.0 / (node.latency or fastest) for node in candidates]
+        point = random.uniform(0, sum(weights))
+        for node, weight in zip(candidates, weights):
+            point -= weight
+            if point <= 0:
+                return node
+        return candidates[-1]
+
+    def _send(self, node, method, url, kwargs):
+        if url.startswith(self.host):
+            url = node.host + url[len(self.host):]
+        with self._lock:
+            node.outstanding += 1
+        started = time.time()
+        try:
+            r = super(RexsterCluster, self)._request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                node.outstanding -= 1
+                node.errors += 1
+                node.failures += 1
+                if node.failures >= self.maxFailures:
+                    node.ejectedUntil = time.time() + self.ejectTime
+            raise
+        elapsed = time.time() - started
+        with self._lock:
+            node.outstanding -= 1
+            node.requests += 1
+            node.failures = 0
+            if node.latency is None:
+                node.latency = elapsed
+            else:
+                node.latency += LATENCY_DECAY * (elapsed - node.latency)
+            if self.maxLatency is not None and not node.primary and \
+                    node.latency > self.maxLatency:
+                node.ejectedUntil = time.time() + self.ejectTime
+                # Measured again from scratch once readmitted
+                node.latency = None
+        return r
+
+    def _request(self, method, url, readOnly=None, **kwargs):
+        """Sends a write to the primary and a read to a replica, trying
+        another node when the replica cannot be reached"""
+        if not self._isRead(method, url, readOnly, kwargs):
+            return self._send(self.primary, method, url, kwargs)
+        tried = []
+        while True:
+            node = self._choose(tried)
+            try:
+                return self._send(node, method, url, kwargs)
+            except requests.exceptions.ConnectionError:
+                tried.append(node)
+                if self._choose(tried) is None:
+                    raise
+
+    def checkHealth(self):
+        """Requests the server document of every node, marking the ones
+        that do not answer as unhealthy, so they receive no reads, and
+        readmitting the ones that answer again
+
+        @returns The list of the healthy nodes"""
+        healthy = []
+        for node in self.nodes:
+            try:
+                r = self.session.get(node.host, timeout=self.healthTimeout)
+                ok = r.ok
+            except requests.exceptions.RequestException:
+                ok = False
+            with self._lock:
+                node.healthy = ok
+                if ok:
+                    node.failures = 0
+            if ok:
+                healthy.append(node)
+        return healthy
+
+    def _checkHealth(self, interval):
+        while not self._stopped.wait(interval):
+            self.checkHealth()
+
+    def nodeStats(self):
+        """Returns the requests in progress, requests, errors, average
+        latency and state of every node
+
+        @returns A list of dictionaries, the primary first"""
+        with self._lock:
+            return [node.asDict() for node in self.nodes]
+
+    def close(self):
+        """Stops the background health checks"""
+        self._stopped.set()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Export of a graph to compressed sparse row arrays.
+
+The vertices and the edges are listed once. The outgoing edges of the
+vertex at position i of ids are the entries between indptr[i] and
+indptr[i + 1] of indices (the positions of their target vertices),
+edgeIds and labels. Chosen vertex and edge properties become columns
+aligned with ids and indices respectively.
+
+save() writes every array as a .npy file of a directory, which load()
+maps into memory, so later analyses do not request the server again."""
+
+import os
+from array import array
+
+import simplejson
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("The CSR export requires numpy")
+
+
+METADATA = 'metadata.json'
+
+
+def _column(values):
+    """Returns a float array when every present value is a number,
+    with NaN for the missing ones, or a unicode array otherwise"""
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, (int, long, float)) and
+            not isinstance(value, bool) for value in present):
+        return numpy.array([numpy.nan if value is None else value
+                            for value in values], dtype=numpy.float64)
+    return numpy.array([u'' if value is None else unicode(value)
+                        for value in values], dtype=numpy.unicode_)
+
+
+class CSRGraph(object):
+    """The adjacency of a graph as NumPy arrays"""
+
+    def __init__(self, ids, indptr, indices, edgeIds, labels,
+                vertexProperties=None, edgeProperties=None):
+        """Creates a new CSR graph from its arrays
+        @params ids: The vertex identifiers, by position
+        @params indptr: The start of the edges of every vertex
+        @params indices: The target vertex position of every edge
+        @params edgeIds: The edge identifiers
+        @params labels: The edge labels
+        @params vertexProperties: Dictionary of columns aligned with ids
+        @params edgeProperties: Dictionary of columns aligned with
+        indices"""
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.edgeIds = edgeIds
+        self.labels = labels
+        self.vertexProperties = vertexProperties or {}
+        self.edgeProperties = edgeProperties or {}
+        self._positions = None
+
+    @classmethod
+    def from_graph(cls, graph, vertexProperties=None, edgeProperties=None,
+                    pageSize=None):
+        """Lists the vertices and the edges of a graph once
+        @params graph: The RexsterGraph to export
+        @params vertexProperties: Optional vertex property keys exported
+        as columns
+        @params edgeProperties: Optional edge property keys exported as
+        columns
+        @params pageSize: Optional number of elements requested at once
+
+        @returns The CSRGraph"""
+        vertexProperties = list(vertexProperties or [])
+        edgeProperties = list(edgeProperties or [])
+        ids = []
+        positions = {}
+        vertexValues = dict((key, []) for key in vertexProperties)
+
+        def position(_id):
+            _id = unicode(_id)
+            index = positions.get(_id)
+            if index is None:
+                index = positions[_id] = len(ids)
+                ids.append(_id)
+                for values in vertexValues.itervalues():
+                    values.append(None)
+            return index
+
+        lazy = not vertexProperties
+        for vertex in graph.getVertices(pageSize, lazy=lazy):
+            index = position(vertex.getId())
+            for key in vertexProperties:
+                vertexValues[key][index] = vertex.properties.get(key)
+
+        sources = array('l')
+        targets = array('l')
+        edgeIds = []
+        labels = []
+        edgeValues = dict((key, []) for key in edgeProperties)
+        for edge in graph.getEdges(pageSize):
+            sources.append(position(edge.properties.get('_outV')))
+            targets.append(position(edge.properties.get('_inV')))
+            edgeIds.append(unicode(edge.getId()))
+            labels.append(edge.getLabel() or u'')
+            for key in edgeProperties:
+                edgeValues[key].append(edge.properties.get(key))
+
+        sources = numpy.frombuffer(sources, dtype=numpy.dtype('l'))
+        order = numpy.argsort(sources, kind='mergesort')
+        counts = numpy.bincount(sources, minlength=len(ids))
+        indptr = numpy.zeros(len(ids) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=indptr[1:])
+        indices = numpy.frombuffer(targets, dtype=numpy.dtype('l'))
+        return cls(numpy.array(ids, dtype=numpy.unicode_),
+                    indptr,
+                    indices[order].astype(numpy.int64),
+                    numpy.array(edgeIds, dtype=numpy.unicode_)[order],
+                    numpy.array(labels, dtype=numpy.unicode_)[order],
+                    dict((key, _column(values))
+                        for key, values in vertexValues.iteritems()),
+                    dict((key, _column(values)[order])
+                        for key, values in edgeValues.iteritems()))
+
+    def position(self, _id):
+        """Returns the position of a vertex in ids
+        @params _id: The vertex identifier
+
+        @returns The position, or None when the vertex is not exported"""
+        if self._positions is None:
+            self._positions = dict((_id, index)
+                                    for index, _id in enumerate(self.ids))
+        return self._positions.get(unicode(_id))
+
+    def outEdges(self, _id):
+        """Returns the slice of indices, edgeIds and labels holding the
+        outgoing edges of a vertex
+        @params _id: The vertex identifier
+
+        @returns A slice object"""
+        index = self.position(_id)
+        if index is None:
+            return slice(0, 0)
+        return slice(self.indptr[index], self.indptr[index + 1])
+
+    def toScipy(self, weightKey=None):
+        """Returns the adjacency as a scipy.sparse.csr_matrix
+        @params weightKey: Optional edge property column used as the
+        values of the matrix, which are 1 otherwise
+
+        @returns The matrix"""
+        from scipy.sparse import csr_matrix
+        if weightKey is None:
+            data = numpy.ones(len(self.indices))
+        else:
+            data = self.edgeProperties[weightKey]
+        size = len(self.ids)
+        return csr_matrix((data, self.indices, self.indptr),
+                            shape=(size, size))
+
+    def _arrays(self):
+        arrays = {'ids': self.ids, 'indptr': self.indptr,
+                    'indices': self.indices, 'edgeIds': self.edgeIds,
+                    'labels': self.labels}
+        for prefix, columns in (('vertex', self.vertexProperties),
+                                ('edge', self.edgeProperties)):
+            for number, key in enumerate(sorted(columns)):
+                arrays['%s-%d' % (prefix, number)] = columns[key]
+        return arrays
+
+    def save(self, directory):
+        """Writes the arrays as .npy files of a directory
+        @params directory: The directory, created when missing"""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name, values in self._arrays().iteritems():
+            numpy.save(os.path.join(directory, '%s.npy' % name), values)
+        with open(os.path.join(directory, METADATA), 'w') as output:
+            simplejson.dump({'vertexProperties': sorted(self.vertexProperties),
+                            'edgeProperties': sorted(self.edgeProperties)},
+                            output)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Reads the arrays written by save()
+        @params directory: The directory
+        @params mmap: Whether to map the files into memory instead of
+        reading them
+
+        @returns The CSRGraph"""
+        mode = 'r' if mmap else None
+
+        def read(name):
+            return numpy.load(os.path.join(directory, '%s.npy' % name),
+                                mmap_mode=mode)
+
+        with open(os.path.join(directory, METADATA)) as metadata:
+            keys = simplejson.load(metadata)
+        return cls(read('ids'), read('indptr'), read('indices'),
+                    read('edgeIds'), read('labels'),
+                    dict((key, read('vertex-%d' % number)) for number, key
+                        in enumerate(keys['vertexProperties'])),
+                    dict((key, read('edge-%d' % number)) for number, key
+                        in enumerate(keys['edgeProperties'])))
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Request instrumentation of the Rexster client.
+
+Every request of a RexsterServer goes through its _request method,
+which calls the before() and after() methods of the hooks added with
+RexsterServer.addHook(), and every JSON response decoded by the client
+calls their decoded() method. Instrumentation is the hook behind
+RexsterServer.instrument() and RexsterServer.stats(): it counts the
+requests, errors, bytes, latency and decode time of every endpoint, and
+can record bursts of requests to the same endpoint made by one public
+method, the usual sign of an N+1 access pattern."""
+
+import bisect
+import sys
+import threading
+import time
+import urllib
+import urlparse
+
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+                    10000, float('inf'))
+
+# Path segments followed by an element id or an index name
+_COLLECTIONS = ('vertices', 'edges', 'indices')
+
+
+def endpoint(method, url):
+    """Returns the endpoint of a request: the method and the URL path
+    with the element ids and index names replaced by placeholders, e.g.
+    GET /tinkergraph/vertices/:id/outE"""
+    segments = urlparse.urlparse(url).path.split('/')
+    for i in xrange(1, len(segments)):
+        if segments[i - 1] in _COLLECTIONS and segments[i]:
+            segments[i] = ':id' if segments[i - 1] != 'indices' else ':name'
+    return "%s %s" % (method.upper(), '/'.join(segments) or '/')
+
+
+def _bodySize(kwargs):
+    data = kwargs.get('data')
+    if not data:
+        return 0
+    if isinstance(data, dict):
+        return len(urllib.urlencode(data))
+    return len(data)
+
+
+def _responseSize(response, kwargs):
+    # Streamed responses are not read yet, their declared size is used
+    if kwargs.get('prefetch', True) is False:
+        return int(response.headers.get('content-length') or 0)
+    return len(response.content or '')
+
+
+class Hook(object):
+    """Base class of the request hooks of a RexsterServer, whose
+    methods do nothing"""
+
+    def before(self, method, url, kwargs):
+        """Called before a request is sent
+        @params method: The HTTP method
+        @params url: The request URL
+        @params kwargs: The keyword arguments of the request"""
+
+    def after(self, method, url, kwargs, response, elapsed, error):
+        """Called after a request is answered or fails
+        @params response: The response, or None when it failed
+        @params elapsed: Seconds until the response was received
+        @params error: The exception raised, or None"""
+
+    def decoded(self, method, url, elapsed):
+        """Called after the JSON body of a response is decoded
+        @params method: The HTTP method of the request
+        @params url: The request URL
+        @params elapsed: Seconds spent decoding"""
+
+
+class _Counters(object):
+    """The statistics of one endpoint"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.time = 0.0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.decodes = 0
+        self.decodeTime = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+
+    def percentile(self, fraction):
+        """Estimates a latency percentile as the upper bound of the
+        histogram bucket holding it"""
+        wanted = fraction * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            seen += count
+            if count and seen >= wanted:
+                return bound
+        return None
+
+    def asDict(self):
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'time': self.time,
+                'meanLatency': self.time / self.requests * 1000
+                                if self.requests else None,
+                'p50': self.percentile(0.5),
+                'p99': self.percentile(0.99),
+                'bytesSent': self.bytesSent,
+                'bytesReceived': self.bytesReceived,
+                'decodes': self.decodes,
+                'decodeTime': self.decodeTime,
+                'histogram': dict(zip(LATENCY_BUCKETS, self.histogram))}
+
+
+class _Burst(object):
+    """The requests to one endpoint made by one method, each less than
+    the burst gap after the previous one"""
+
+    def __init__(self, caller, endpoint, now):
+        self.caller = caller
+        self.endpoint = endpoint
+        self.count = 0
+        self.startedAt = now
+        self.lastAt = now
+        # The entry of Instrumentation.bursts, once the threshold is met
+        self.record = None
+
+
+class Instrumentation(Hook):
+    """Per endpoint counters, latency histograms, bytes and decode
+    time of the requests of a server"""
+
+    def __init__(self, burstThreshold=None, burstGap=1.0, burstLog=None):
+        """Creates a new instrumentation hook
+        @params burstThreshold: Optional number of requests to the same
+        endpoint from the same public method, each less than burstGap
+        seconds after the previous one, recorded as a burst; None
+        disables the detection
+        @params burstGap: Seconds without a request that end a burst
+        @params burstLog: Optional file object every burst is written to"""
+        self.burstThreshold = burstThreshold
+        self.burstGap = burstGap
+        self.burstLog = burstLog
+        self.bursts = []
+        self._endpoints = {}
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+    def _counters(self, name):
+        counters = self._endpoints.get(name)
+        if counters is None:
+            counters = self._endpoints[name] = _Counters()
+        return counters
+
+    def before(self, method, url, kwargs):
+        if self.burstThreshold:
+            self._track(_caller(), endpoint(method, url))
+
+    def after(self, method, url, kwargs, response, elapsed, error):
+        name = endpoint(method, url)
+        received = 0
+        if response is not None:
+            received = _responseSize(response, kwargs)
+        with self._lock:
+            counters = self._counters(name)
+            counters.requests += 1
+            counters.time += elapsed
+            counters.bytesSent += _bodySize(kwargs)
+            counters.bytesReceived += received
+            if error is not None or response is None or \
+                    response.status_code >= 400:
+                counters.errors += 1
+            bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed * 1000)
+            counters.histogram[bucket] += 1
+
+    def decoded(self, method, url, elapsed):
+        name = endpoint(method, url)
+        with self._lock:
+            counters = self._counters(name)
+            counters.decodes += 1
+            counters.decodeTime += elapsed
+
+    def _track(self, caller, name):
+        now = time.time()
+        bursts = getattr(self._current, 'bursts', None)
+        if bursts is None:
+            bursts = self._current.bursts = {}
+        for key, burst in bursts.items():
+            if now - burst.lastAt > self.burstGap:
+                del bursts[key]
+                self._finish(burst)
+        burst = bursts.get((caller, name))
+        if burst is None:
+            burst = bursts[(caller, name)] = _Burst(caller, name, now)
+        burst.count += 1
+        burst.lastAt = now
+        if burst.record is None and burst.count >= self.burstThreshold:
+            burst.record = {'caller': caller, 'endpoint': name}
+            with self._lock:
+                self.bursts.append(burst.record)
+        if burst.record is not None:
+            burst.record['requests'] = burst.count
+            burst.record['duration'] = now - burst.startedAt
+
+    def _finish(self, burst):
+        if burst.record is not None and self.burstLog is not None:
+            self.burstLog.write("%(caller)s made %(requests)d requests to "
+                                "%(endpoint)s in %(duration).3fs\n" %
+                                burst.record)
+            self.burstLog.flush()
+
+    def flushBursts(self):
+        """Ends the bursts in progress in the current thread, writing
+        them to the burst log"""
+        bursts = getattr(self._current, 'bursts', None) or {}
+        self._current.bursts = {}
+        for burst in bursts.itervalues():
+            self._finish(burst)
+
+    def stats(self):
+        """Returns the statistics of every endpoint
+
+        @returns A dictionary of statistics dictionaries by endpoint,
+        plus their sum under 'total'"""
+        with self._lock:
+            stats = dict((name, counters.asDict())
+                        for name, counters in self._endpoints.iteritems())
+            total = _Counters()
+            for counters in self._endpoints.itervalues():
+                for attribute in ('requests', 'errors', 'time', 'bytesSent',
+                                'bytesReceived', 'decodes', 'decodeTime'):
+                    setattr(total, attribute, getattr(total, attribute) +
+                            getattr(counters, attribute))
+                total.histogram = [a + b for a, b in
+                                    zip(total.histogram, counters.histogram)]
+        stats['total'] = total.asDict()
+        return stats
+
+    def reset(self):
+        """Drops every statistic and recorded burst"""
+        with self._lock:
+            self._endpoints.clear()
+            self.bursts = []
+        self._current = threading.local()
+
+
+def _caller():
+    """Returns the outermost public method of the client in the call
+    stack, as Class.method, which is the one the application called"""
+    caller = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        name = frame.f_code.co_name
+        if (module == 'rexster' or module.startswith('rexster.')) and \
+                module != __name__ and not name.startswith('_'):
+            instance = frame.f_locals.get('self')
+            if instance is not None:
+                name = "%s.%s" % (type(instance).__name__, name)
+            caller = name
+        frame = frame.f_back
+    return caller
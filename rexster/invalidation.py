@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Cache invalidation between the clients of a graph.
+
+A graph created with an invalidationBus publishes a message on the bus
+for every change it makes: the properties set or removed on an element,
+a removed vertex or edge, an index entry put or removed or a dropped
+index. The other graphs subscribed to the bus drop what the change made
+stale: the copy of the element in their element cache, their cached index
+lookups and their index catalog. Clients kept in sync this way can read
+properties in the CACHED mode instead of requesting them on every call.
+
+LocalBus connects the graphs of one process, UDPBus the processes of a
+group of peers. Messages are dictionaries of JSON values:
+
+    origin    Identifier of the publishing graph object
+    graph     The graph name
+    resource  'vertices', 'edges' or 'indices'
+    id        The element identifier or the index name
+    keys      The property keys changed, for elements
+    key       The key of the index entry changed, for indices
+    value     The value of the index entry changed, for indices
+    removed   Whether the element or index was removed
+"""
+
+import socket
+import threading
+
+import simplejson
+
+
+# Larger messages do not fit in a UDP datagram
+MAX_DATAGRAM = 65507
+
+
+class Bus(object):
+    """Base class of the invalidation buses, delivering every message
+    published to the callbacks subscribed"""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Adds a function called with every message published
+        @params callback: A function receiving the message dictionary"""
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        """Removes a function added with subscribe
+        @params callback: The function to remove"""
+        with self._lock:
+            self._subscribers = [other for other in self._subscribers
+                                if other != callback]
+
+    def _deliver(self, message):
+        for callback in self._subscribers:
+            callback(message)
+
+    def publish(self, message):
+        """Sends a message to the subscribers
+        @params message: The message dictionary"""
+        raise NotImplementedError
+
+    def close(self):
+        """Releases the resources of the bus"""
+
+
+class LocalBus(Bus):
+    """Delivers the messages to the subscribers of the same process,
+    synchronously"""
+
+    def publish(self, message):
+        self._deliver(message)
+
+
+class UDPBus(Bus):
+    """Sends the messages as JSON datagrams to a list of peers, and
+    delivers the ones received from them from a background thread.
+    Delivery is not guaranteed, as datagrams may be lost, so the caches
+    of the subscribers should still have a TTL"""
+
+    def __init__(self, peers=None, host='0.0.0.0', port=0):
+        """Creates a new bus listening for datagrams
+        @params peers: Optional list of (host, port) addresses the
+        messages are sent to, usually the buses of the other processes
+        @params host: The address listened
+        @params port: The UDP port listened, 0 picks a free one"""
+        super(UDPBus, self).__init__()
+        self.peers = list(peers or [])
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self.address = self._socket.getsockname()
+        self._closed = False
+        self._thread = threading.Thread(target=self._receive)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def addPeer(self, address):
+        """Starts sending the messages to another bus
+        @params address: Its (host, port) address"""
+        self.peers = self.peers + [tuple(address)]
+
+    def publish(self, message):
+        data = simplejson.dumps(message)
+        if len(data) > MAX_DATAGRAM:
+            # Dropping the changed keys leaves a message invalidating the
+            # whole element, which always fits
+            message = dict(message, keys=None)
+            data = simplejson.dumps(message)
+        for peer in self.peers:
+            self._socket.sendto(data, peer)
+        self._deliver(message)
+
+    def _receive(self):
+        while not self._closed:
+            try:
+                data, address = self._socket.recvfrom(MAX_DATAGRAM)
+            except socket.error:
+                if self._closed:
+                    return
+                continue
+            try:
+                message = simplejson.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            try:
+                self._deliver(message)
+            except Exception:
+                # A failing subscriber must not stop the other messages
+                pass
+
+    def close(self):
+        self._closed = True
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._socket.close()
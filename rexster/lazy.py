@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Lightweight element handles.
+
+A handle only keeps its graph, its id and, for edges, the label and the
+ids of the vertices, so creating one never requests the server and
+millions of them fit where only thousands of full elements would. The
+properties are requested on the first access and kept afterwards."""
+
+from rexster import Edge, RexsterException, Vertex
+
+
+class LazyElement(object):
+    """An element handle whose properties are loaded on demand"""
+    __slots__ = ('graph', '_id', '_properties')
+    _elementClass = None
+
+    def __init__(self, graph, _id):
+        """Creates a new handle without requesting the element
+        @params graph: The graph object the element belongs
+        @params _id: The element unique identifier"""
+        self.graph = graph
+        self._id = _id
+        self._properties = None
+
+    @classmethod
+    def from_payload(cls, graph, payload):
+        """Creates a handle from the JSON object returned by Rexster,
+        keeping only the identifiers
+        @params graph: The graph object the element belongs
+        @params payload: The element JSON object
+
+        @returns The handle"""
+        return cls(graph, payload.get('_id'))
+
+    @property
+    def url(self):
+        return "%s/%s/%s" % (self.graph.url, self._elementClass._resource,
+                            self._id)
+
+    def _getProperties(self):
+        if self._properties is None:
+            properties = self.graph._getPayload(self._elementClass, self._id)
+            if properties is None:
+                raise RexsterException("Could not load %s %s" %
+                                        (self._elementClass.__name__,
+                                        self._id))
+            if self.graph._writeBehind is not None:
+                self.graph._writeBehind.overlay(self.url, properties)
+            self._properties = properties
+        return self._properties
+
+    def isLoaded(self):
+        """Returns whether the properties have been requested already"""
+        return self._properties is not None
+
+    def invalidate(self):
+        """Drops the loaded properties, so they are requested again on
+        the next read"""
+        self._properties = None
+
+    def load(self):
+        """Returns the full element of the handle
+
+        @returns The Vertex or Edge with the same id"""
+        return self.graph._hydrate(self._elementClass, self._getProperties())
+
+    def getId(self):
+        """Returns the unique identifier of the element
+
+        @returns The unique identifier of the element"""
+        return self._id
+
+    def getProperty(self, key):
+        """Gets the value of the property for the given key, loading the
+        properties on the first call
+        @params key: The key which value is being retrieved
+
+        @returns The value of the property with the given key"""
+        return self._getProperties().get(key)
+
+    def getPropertyKeys(self):
+        """Returns a set with the property keys of the element
+
+        @returns Set of property keys"""
+        return self._getProperties().keys()
+
+    def setProperty(self, key, value):
+        """Sets the property of the element to the given value
+        @params key: The property key to set
+        @params value: The value to set"""
+        if self.graph._writeBehind is not None:
+            if self._properties is not None:
+                self._properties[key] = value
+            self.graph._discardCopies(self)
+            self.graph._writeBehind.setProperty(self, key, value)
+            return
+        r = self.graph.server._request('post', self.url, data={key: value})
+        if r.error:
+            error_msg = self.graph.server._decode(r)['message']
+            raise RexsterException(error_msg)
+        if self._properties is not None:
+            self._properties[key] = value
+        self.graph._discardCopies(self)
+        self.graph._propertiesChanged(self, [key])
+
+    def removeProperty(self, key):
+        """Removes the value of the property for the given key
+        @params key: The key which value is being removed"""
+        if self.graph._writeBehind is not None:
+            if self._properties is not None:
+                self._properties.pop(key, None)
+            self.graph._discardCopies(self)
+            self.graph._writeBehind.removeProperty(self, key)
+            return
+        r = self.graph.server._request('delete', self.url,
+                                        params={key: ''})
+        if r.error:
+            error_msg = self.graph.server._decode(r)['message']
+            raise RexsterException(error_msg)
+        if self._properties is not None:
+            self._properties.pop(key, None)
+        self.graph._discardCopies(self)
+        self.graph._propertiesChanged(self, [key])
+
+    def __eq__(self, other):
+        """A handle equals the handles and the full elements of the
+        same kind and id
+        @params other: the objects to be compared with"""
+        return getattr(other, '_resource', None) == self._resource and \
+            unicode(self.getId()) == unicode(other.getId())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._resource, unicode(self.getId())))
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self._id)
+
+
+class LazyVertex(LazyElement):
+    """A vertex handle"""
+    __slots__ = ()
+    _elementClass = Vertex
+    _resource = Vertex._resource
+
+    def _list(self, path, cls, label, pageSize):
+        url = "%s/%s" % (self.url, path)
+        params = {'_label': label} if label else None
+        for item in self.graph._iterResults(url, params, pageSize):
+            yield cls.from_payload(self.graph, item)
+
+    def getOutEdges(self, label=None, pageSize=None):
+        """Gets the handles of the outgoing edges of the node, only
+        the ones of the given label when provided
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of edges requested at once
+
+        @returns A generator function with the edge handles"""
+        return self._list('outE', LazyEdge, label, pageSize)
+
+    def getInEdges(self, label=None, pageSize=None):
+        """Gets the handles of the incoming edges of the node, only
+        the ones of the given label when provided
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of edges requested at once
+
+        @returns A generator function with the edge handles"""
+        return self._list('inE', LazyEdge, label, pageSize)
+
+    def getBothEdges(self, label=None, pageSize=None):
+        """Gets the handles of all the edges of the node, only the
+        ones of the given label when provided
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of edges requested at once
+
+        @returns A generator function with the edge handles"""
+        return self._list('bothE', LazyEdge, label, pageSize)
+
+    def getOutVertices(self, label=None, pageSize=None):
+        """Gets the handles of the vertices at the end of the outgoing
+        edges, only the edges of the given label when provided
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of vertices requested at once
+
+        @returns A generator function with the vertex handles"""
+        return self._list('out', LazyVertex, label, pageSize)
+
+    def getInVertices(self, label=None, pageSize=None):
+        """Gets the handles of the vertices at the start of the incoming
+        edges, only the edges of the given label when provided
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of vertices requested at once
+
+        @returns A generator function with the vertex handles"""
+        return self._list('in', LazyVertex, label, pageSize)
+
+    def getBothVertices(self, label=None, pageSize=None):
+        """Gets the handles of the adjacent vertices, only through the
+        edges of the given label when provided
+        @params label: Optional parameter to filter the edges
+        @params pageSize: Optional number of vertices requested at once
+
+        @returns A generator function with the vertex handles"""
+        return self._list('both', LazyVertex, label, pageSize)
+
+
+class LazyEdge(LazyElement):
+    """An edge handle, which also keeps the label and the ids of its
+    vertices when they are known"""
+    __slots__ = ('_label', '_outV', '_inV')
+    _elementClass = Edge
+    _resource = Edge._resource
+
+    def __init__(self, graph, _id, label=None, outV=None, inV=None):
+        """Creates a new handle without requesting the edge
+        @params graph: The graph object the edge belongs
+        @params _id: The edge unique identifier
+        @params label: Optional edge label
+        @params outV: Optional identifier of the origin vertex
+        @params inV: Optional identifier of the target vertex"""
+        super(LazyEdge, self).__init__(graph, _id)
+        self._label = label
+        self._outV = outV
+        self._inV = inV
+
+    @classmethod
+    def from_payload(cls, graph, payload):
+        return cls(graph, payload.get('_id'), payload.get('_label'),
+                    payload.get('_outV'), payload.get('_inV'))
+
+    def _endpoints(self):
+        if None in (self._label, self._outV, self._inV):
+            properties = self._getProperties()
+            self._label = properties.get('_label')
+            self._outV = properties.get('_outV')
+            self._inV = properties.get('_inV')
+
+    def getOutVertex(self):
+        """Returns the handle of the origin vertex of the edge
+
+        @returns The origin LazyVertex"""
+        self._endpoints()
+        return LazyVertex(self.graph, self._outV)
+
+    def getInVertex(self):
+        """Returns the handle of the target vertex of the edge
+
+        @returns The target LazyVertex"""
+        self._endpoints()
+        return LazyVertex(self.graph, self._inV)
+
+    def getLabel(self):
+        """Returns the label of the edge
+
+        @returns The edge label"""
+        self._endpoints()
+        return self._label
@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""On-disk snapshots of a graph read through a memory map.
+
+dump() writes the vertices, edges and index contents of a graph to a
+single file: the JSON object of every element, the offsets of those
+objects and the outgoing and incoming edges of every vertex as arrays
+of little-endian 64 bit integers, and a JSON table of contents at the
+end. SnapshotGraph maps the file and offers the read methods of
+RexsterGraph, decoding an element only when it is requested, so batch
+jobs and tests can read a graph without a Rexster server.
+
+Rexster cannot list the contents of a manual index, so dump() stores
+only the (key, value) pairs given in indexEntries for them. Automatic
+indices are rebuilt from the properties of the elements."""
+
+import mmap
+import struct
+import time
+from array import array
+
+import simplejson
+
+from rexster import (CACHED, AutomaticIndex, Edge, Index, RexsterException,
+                    RexsterIndexableGraph, Vertex)
+
+
+MAGIC = 'RXSNAP01'
+HEADER = struct.Struct('<8sQ')
+INT64 = struct.Struct('<q')
+# Number of integers packed at once when writing an array
+CHUNK = 65536
+
+
+def _writeArray(output, values):
+    """Writes integers as little-endian 64 bit integers
+
+    @returns The file offset of the array"""
+    offset = output.tell()
+    for start in xrange(0, len(values), CHUNK):
+        chunk = values[start:start + CHUNK]
+        output.write(struct.pack('<%dq' % len(chunk), *chunk))
+    return offset
+
+
+def _writeJSON(output, value):
+    """Writes a JSON document
+
+    @returns The [offset, length] of the document"""
+    offset = output.tell()
+    data = simplejson.dumps(value)
+    output.write(data)
+    return [offset, len(data)]
+
+
+def _rows(size, sources):
+    """Groups the edge positions by the vertex position in sources
+
+    @returns The (indptr, edge positions) arrays"""
+    indptr = array('l', [0]) * (size + 1)
+    for source in sources:
+        if source >= 0:
+            indptr[source + 1] += 1
+    for i in xrange(size):
+        indptr[i + 1] += indptr[i]
+    positions = indptr[:-1]
+    edges = array('l', [0]) * indptr[size]
+    for edge, source in enumerate(sources):
+        if source >= 0:
+            edges[positions[source]] = edge
+            positions[source] += 1
+    return indptr, edges
+
+
+def _autoKeys(graph, index):
+    """Returns the keys of an automatic index, None meaning all of them"""
+    automatic = AutomaticIndex(graph, index.indexName, index.indexClass,
+                                index.indexType)
+    return automatic.getAutoIndexKeys() or None
+
+
+def _indexProperties(entries, keys, properties):
+    _id = unicode(properties.get('_id'))
+    for key, value in properties.iteritems():
+        if key.startswith('_') or (keys is not None and key not in keys):
+            continue
+        entries.setdefault(key, {}).setdefault(unicode(value),
+                                                []).append(_id)
+
+
+def dump(graph, path, indexEntries=None, pageSize=None):
+    """Writes a snapshot of a graph to a file
+    @params graph: The RexsterGraph or RexsterIndexableGraph to dump
+    @params path: The snapshot file path
+    @params indexEntries: Optional dictionary with the list of (key,
+    value) pairs stored for every manual index name
+    @params pageSize: Optional number of elements requested at once"""
+    indexEntries = indexEntries or {}
+    indices = []
+    if isinstance(graph, RexsterIndexableGraph):
+        for index in graph.getIndices():
+            keys = None
+            if index.getIndexType() == 'automatic':
+                keys = _autoKeys(graph, index)
+            indices.append((index, keys, {}))
+
+    with open(path, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, 0))
+        toc = {'name': graph.name, 'createdAt': time.time(),
+                'metadata': graph.getMetadata()}
+
+        vertexIds = []
+        vertexPositions = {}
+        vertexOffsets = array('l')
+        for vertex in graph.getVertices(pageSize):
+            properties = vertex.properties
+            _id = unicode(vertex.getId())
+            vertexPositions[_id] = len(vertexIds)
+            vertexIds.append(_id)
+            vertexOffsets.append(output.tell())
+            output.write(simplejson.dumps(properties))
+            for index, keys, entries in indices:
+                if index.getIndexType() == 'automatic' and \
+                        index.getIndexClass() == 'vertex':
+                    _indexProperties(entries, keys, properties)
+        vertexOffsets.append(output.tell())
+
+        edgeIds = []
+        edgeOffsets = array('l')
+        sources = array('l')
+        targets = array('l')
+        for edge in graph.getEdges(pageSize):
+            properties = edge.properties
+            edgeIds.append(unicode(edge.getId()))
+            edgeOffsets.append(output.tell())
+            output.write(simplejson.dumps(properties))
+            sources.append(vertexPositions.get(
+                unicode(properties.get('_outV')), -1))
+            targets.append(vertexPositions.get(
+                unicode(properties.get('_inV')), -1))
+            for index, keys, entries in indices:
+                if index.getIndexType() == 'automatic' and \
+                        index.getIndexClass() == 'edge':
+                    _indexProperties(entries, keys, properties)
+        edgeOffsets.append(output.tell())
+
+        toc['vertices'] = {'count': len(vertexIds),
+                            'ids': _writeJSON(output, vertexIds),
+                            'offsets': _writeArray(output, vertexOffsets)}
+        toc['edges'] = {'count': len(edgeIds),
+                        'ids': _writeJSON(output, edgeIds),
+                        'offsets': _writeArray(output, edgeOffsets)}
+        for direction, ends in (('out', sources), ('in', targets)):
+            indptr, edges = _rows(len(vertexPositions), ends)
+            toc[direction] = {'indptr': _writeArray(output, indptr),
+                                'edges': _writeArray(output, edges)}
+
+        toc['indices'] = []
+        for index, keys, entries in indices:
+            if index.getIndexType() != 'automatic':
+                for key, value in indexEntries.get(index.getIndexName(), []):
+                    ids = [unicode(element.getId()) for element in
+                            index.get(key, value, pageSize)]
+                    entries.setdefault(key, {})[unicode(value)] = ids
+            toc['indices'].append({'name': index.getIndexName(),
+                                    'class': index.getIndexClass(),
+                                    'type': index.getIndexType(),
+                                    'keys': keys,
+                                    'entries': _writeJSON(output, entries)})
+
+        tocOffset = output.tell()
+        output.write(simplejson.dumps(toc))
+        output.seek(0)
+        output.write(HEADER.pack(MAGIC, tocOffset))
+
+
+class SnapshotVertex(Vertex):
+    """A read-only vertex of a snapshot"""
+    cacheMode = CACHED
+
+    def refresh(self):
+        self._setProperties(self.graph._payload('vertices', self._position))
+
+    def setProperty(self, key, value):
+        raise RexsterException("Snapshots are read-only")
+
+    def removeProperty(self, key):
+        raise RexsterException("Snapshots are read-only")
+
+    def _edges(self, direction, label):
+        for edge in self.graph._incidentEdges(self._position, direction):
+            if label is None or edge.getLabel() == label:
+                yield edge
+
+    def _vertices(self, direction, label):
+        for edge in self._edges(direction, label):
+            if direction == 'in' or (direction == 'both' and
+                    edge.properties.get('_inV') == self._id):
+                yield edge.getOutVertex()
+            else:
+                yield edge.getInVertex()
+
+    def getOutEdges(self, label=None, pageSize=None, lazy=False):
+        return self._edges('out', label)
+
+    def getInEdges(self, label=None, pageSize=None, lazy=False):
+        return self._edges('in', label)
+
+    def getBothEdges(self, label=None, pageSize=None, lazy=False):
+        return self._edges('both', label)
+
+    def getOutVertices(self, label=None, pageSize=None, lazy=False):
+        return self._vertices('out', label)
+
+    def getInVertices(self, label=None, pageSize=None, lazy=False):
+        return self._vertices('in', label)
+
+    def getBothVertices(self, label=None, pageSize=None, lazy=False):
+        return self._vertices('both', label)
+
+    def _count(self, direction, label):
+        return sum(1 for edge in self._edges(direction, label))
+
+    def traverse(self):
+        raise RexsterException("Snapshots cannot run Gremlin traversals")
+
+
+class SnapshotEdge(Edge):
+    """A read-only edge of a snapshot"""
+    cacheMode = CACHED
+
+    def refresh(self):
+        self._setProperties(self.graph._payload('edges', self._position))
+
+    def setProperty(self, key, value):
+        raise RexsterException("Snapshots are read-only")
+
+    def removeProperty(self, key):
+        raise RexsterException("Snapshots are read-only")
+
+
+class SnapshotIndex(Index):
+    """A read-only index of a snapshot"""
+
+    def __init__(self, graph, indexName, indexClass, indexType, keys,
+                location):
+        super(SnapshotIndex, self).__init__(graph, indexName, indexClass,
+                                            indexType)
+        self.keys = keys
+        self._location = location
+        self._entries = None
+
+    def _ids(self, key, value):
+        if self._entries is None:
+            self._entries = self.graph._json(self._location)
+        return self._entries.get(key, {}).get(unicode(value), [])
+
+    def count(self, key, value):
+        return len(self._ids(key, value))
+
+    def get(self, key, value, pageSize=None):
+        if self.indexClass == 'vertex':
+            getElement = self.graph.getVertex
+        else:
+            getElement = self.graph.getEdge
+        for _id in self._ids(key, value):
+            element = getElement(_id)
+            if element is not None:
+                yield element
+
+    def getAutoIndexKeys(self):
+        """Returns the keys of an automatic index, or None when every
+        key is indexed"""
+        return self.keys
+
+    def _put(self, key, value, klass, _id):
+        raise RexsterException("Snapshots are read-only")
+
+    def remove(self, key, value, element):
+        raise RexsterException("Snapshots are read-only")
+
+
+class SnapshotGraph(object):
+    """A read-only graph served from a snapshot file"""
+    # Snapshots are read-only, so they never buffer writes
+    _writeBehind = None
+
+    def __init__(self, path):
+        """Maps a snapshot written by dump()
+        @params path: The snapshot file path"""
+        self.path = path
+        self.url = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+        magic, tocOffset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise RexsterException("%s is not a graph snapshot" % path)
+        self._toc = simplejson.loads(self._map[tocOffset:])
+        self.name = self._toc['name']
+        self._positions = {}
+        for resource in ('vertices', 'edges'):
+            ids = self._json(self._toc[resource]['ids'])
+            self._positions[resource] = dict((_id, position)
+                                            for position, _id in enumerate(ids))
+
+    def close(self):
+        """Unmaps the snapshot file"""
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _int64(self, offset, position):
+        return INT64.unpack_from(self._map, offset + 8 * position)[0]
+
+    def _int64s(self, offset, start, end):
+        return struct.unpack_from('<%dq' % (end - start), self._map,
+                                offset + 8 * start)
+
+    def _json(self, location):
+        offset, length = location
+        return simplejson.loads(self._map[offset:offset + length])
+
+    def _payload(self, resource, position):
+        offsets = self._toc[resource]['offsets']
+        start = self._int64(offsets, position)
+        end = self._int64(offsets, position + 1)
+        return simplejson.loads(self._map[start:end])
+
+    def _element(self, cls, resource, position):
+        element = cls.from_payload(self, self._payload(resource, position))
+        element._position = position
+        return element
+
+    def _incidentEdges(self, position, direction):
+        directions = ('out', 'in') if direction == 'both' else (direction,)
+        for name in directions:
+            rows = self._toc[name]
+            start = self._int64(rows['indptr'], position)
+            end = self._int64(rows['indptr'], position + 1)
+            for edge in self._int64s(rows['edges'], start, end):
+                yield self._element(SnapshotEdge, 'edges', edge)
+
+    def _getElement(self, cls, _id):
+        if issubclass(cls, Vertex):
+            return self.getVertex(_id)
+        return self.getEdge(_id)
+
+    def _discardCopies(self, element):
+        pass
+
+    def getMetadata(self):
+        """Returns the graph metadata at the time of the dump"""
+        return self._toc['metadata']
+
+    def getVertex(self, _id):
+        """Retrieves a vertex of the snapshot
+        @params _id: Vertex unique identifier
+
+        @returns The requested SnapshotVertex or None"""
+        position = self._positions['vertices'].get(unicode(_id))
+        if position is None:
+            return None
+        return self._element(SnapshotVertex, 'vertices', position)
+
+    def getVertices(self, pageSize=None, lazy=False):
+        """Returns a generator function over all the vertices"""
+        for position in xrange(self._toc['vertices']['count']):
+            yield self._element(SnapshotVertex, 'vertices', position)
+
+    def getEdge(self, _id):
+        """Retrieves an edge of the snapshot
+        @params _id: Edge unique identifier
+
+        @returns The requested SnapshotEdge or None"""
+        position = self._positions['edges'].get(unicode(_id))
+        if position is None:
+            return None
+        return self._element(SnapshotEdge, 'edges', position)
+
+    def getEdges(self, pageSize=None, lazy=False):
+        """Returns a generator function over all the edges"""
+        for position in xrange(self._toc['edges']['count']):
+            yield self._element(SnapshotEdge, 'edges', position)
+
+    def _index(self, entry):
+        return SnapshotIndex(self, entry['name'], entry['class'],
+                            entry['type'], entry['keys'], entry['entries'])
+
+    def getIndices(self):
+        """Returns a generator function over all the dumped indices"""
+        for entry in self._toc['indices']:
+            yield self._index(entry)
+
+    def getIndex(self, indexName, indexClass=None):
+        """Retrieves a dumped index by its name
+        @params indexName: The index name
+
+        @returns The SnapshotIndex object or None"""
+        for entry in self._toc['indices']:
+            if entry['name'] == indexName:
+                return self._index(entry)
+        return None
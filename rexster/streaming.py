@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import codecs
+
+import simplejson
+
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = u' \t\n\r'
+_DELIMITERS = _WHITESPACE + u',:]}'
+_decoder = simplejson.JSONDecoder()
+
+
+class _Reader(object):
+    """Keeps the decoded text of a JSON document that is not
+    consumed yet, reading more chunks only when needed"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u''
+        self.pos = 0
+        self.done = False
+
+    def more(self):
+        """Appends the next chunk to the buffer, dropping the text
+        already consumed
+
+        @returns False when the document has been read completely"""
+        if self.done:
+            return False
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        try:
+            chunk = self.chunks.next()
+        except StopIteration:
+            self.done = True
+            self.buffer += self.decoder.decode('', True)
+            return False
+        self.buffer += self.decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character, or None
+        at the end of the document"""
+        while True:
+            while (self.pos < len(self.buffer) and
+                    self.buffer[self.pos] in _WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return None
+
+    def expect(self, chars):
+        """Consumes the next character, which must be one of chars"""
+        char = self.peek()
+        if char is None or char not in chars:
+            raise ValueError("Expected one of %r at %r" % (chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decodes the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self.more():
+                    raise
+                continue
+            # A number cut by the end of the chunk may go on in the next one
+            if (end == len(self.buffer) or
+                    self.buffer[end] not in _DELIMITERS) and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def iterResults(chunks):
+    """Yields the items of the top-level results array of a JSON
+    document as soon as each one is decoded, so only one item is
+    held in memory at a time
+    @params chunks: An iterable over the raw chunks of the document
+
+    @returns A generator over the decoded items"""
+    reader = _Reader(chunks)
+    reader.expect(u'{')
+    if reader.peek() == u'}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(u':')
+        if key == u'results' and reader.peek() == u'[':
+            reader.expect(u'[')
+            if reader.peek() == u']':
+                reader.expect(u']')
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(u',]') == u']':
+                        break
+        elif key == u'results':
+            value = reader.value()
+            if value is not None:
+                yield value
+        else:
+            reader.value()
+        if reader.expect(u',}') == u'}':
+            return
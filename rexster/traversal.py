@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from rexster import Edge, Vertex
+
+
+class Traversal(object):
+    """A lazy multi-hop traversal. Every step only adds to a Gremlin
+    pipeline, which is executed in the server as a single script when
+    the traversal is iterated or counted. All the values given to the
+    steps are bound as script parameters"""
+
+    def __init__(self, graph, _id=None):
+        """Creates a new traversal
+        @params graph: The graph to traverse
+        @params _id: The identifier of the start vertex, or None to
+        start from all the vertices"""
+        self.graph = graph
+        self._params = {}
+        if _id is None:
+            self._script = ['g.V']
+        else:
+            self._script = ['g.v(%s)' % self._bind(_id)]
+
+    def _bind(self, value):
+        name = 'p%d' % len(self._params)
+        self._params[name] = value
+        return name
+
+    def _step(self, name, *args):
+        names = [self._bind(arg) for arg in args]
+        self._script.append('.%s(%s)' % (name, ','.join(names)))
+        return self
+
+    def out(self, *labels):
+        """Moves to the vertices at the end of the outgoing edges,
+        optionally only the edges with the given labels"""
+        return self._step('out', *labels)
+
+    def in_(self, *labels):
+        """Moves to the vertices at the start of the incoming edges,
+        optionally only the edges with the given labels"""
+        return self._step('in', *labels)
+
+    def both(self, *labels):
+        """Moves to the adjacent vertices, optionally only through the
+        edges with the given labels"""
+        return self._step('both', *labels)
+
+    def outE(self, *labels):
+        """Moves to the outgoing edges, optionally only the ones with
+        the given labels"""
+        return self._step('outE', *labels)
+
+    def inE(self, *labels):
+        """Moves to the incoming edges, optionally only the ones with
+        the given labels"""
+        return self._step('inE', *labels)
+
+    def bothE(self, *labels):
+        """Moves to the incident edges, optionally only the ones with
+        the given labels"""
+        return self._step('bothE', *labels)
+
+    def outV(self):
+        """Moves from edges to their origin vertices"""
+        return self._step('outV')
+
+    def inV(self):
+        """Moves from edges to their target vertices"""
+        return self._step('inV')
+
+    def bothV(self):
+        """Moves from edges to both of their vertices"""
+        return self._step('bothV')
+
+    def has(self, key, value):
+        """Keeps the elements whose property key equals value"""
+        return self._step('has', key, value)
+
+    def dedup(self):
+        """Removes the repeated elements"""
+        return self._step('dedup')
+
+    def limit(self, count):
+        """Keeps only the first count elements"""
+        self._script.append('[0..<%s]' % self._bind(count))
+        return self
+
+    def script(self):
+        """Returns the Gremlin script and parameters of the traversal
+
+        @returns A (script, params) tuple"""
+        return ''.join(self._script), dict(self._params)
+
+    def count(self):
+        """Returns the number of elements the traversal reaches"""
+        script, params = self.script()
+        content = self.graph.gremlin_execute('%s.count()' % script, params,
+                                            readOnly=True)
+        return content['results'][0]
+
+    def __iter__(self):
+        """Executes the traversal, yielding the reached vertices and
+        edges while the response is being read"""
+        script, params = self.script()
+        for item in self.graph.gremlin_execute(script, params, stream=True,
+                                                readOnly=True):
+            if not isinstance(item, dict):
+                yield item
+            elif item.get('_type') == 'vertex':
+                yield self.graph._hydrate(Vertex, item)
+            elif item.get('_type') == 'edge':
+                yield self.graph._hydrate(Edge, item)
+            else:
+                yield item
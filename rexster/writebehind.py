@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Write-behind buffering of element property changes.
+
+While a graph has a WriteBehind buffer, setProperty() and removeProperty()
+of its vertices and edges only change the local copy and record the
+change. The changes to one element are merged, the latest value of a key
+winning, and sent when the buffer is flushed: one POST with every set
+property and, when some were removed, one DELETE with their keys."""
+
+import threading
+
+from rexster import Edge, RexsterException, Vertex
+
+
+class WriteBehind(object):
+    """The property changes of a graph waiting to be sent"""
+
+    def __init__(self, graph, maxPending=1000, maxDelay=None,
+                failFast=True):
+        """Creates a new buffer
+        @params graph: The graph whose changes are buffered
+        @params maxPending: Number of elements with pending changes that
+        triggers a flush
+        @params maxDelay: Optional seconds after which the first pending
+        change is flushed, from a background timer
+        @params failFast: Whether flush() raises a RexsterException when
+        a write fails, which is recorded in errors otherwise"""
+        self.graph = graph
+        self.maxPending = maxPending
+        self.maxDelay = maxDelay
+        self.failFast = failFast
+        self.errors = []
+        # Pending changes by element url: [set properties, removed keys,
+        # element]
+        self._pending = {}
+        # The changes of the flush in progress, still not on the server
+        self._sending = {}
+        self._lock = threading.RLock()
+        # Serializes the flushes, so the changes to an element are sent
+        # in order, without holding _lock during the requests
+        self._flushLock = threading.Lock()
+        self._timer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The changes are already visible locally, so they are sent even
+        # when the block failed, but without hiding its exception
+        self.close(failFast=self.failFast and exc_type is None)
+        return False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _record(self, element, key, value=None, remove=False):
+        with self._lock:
+            changes = self._pending.get(element.url)
+            if changes is None:
+                changes = self._pending[element.url] = [{}, set(), element]
+                if self.maxDelay is not None and self._timer is None:
+                    self._timer = threading.Timer(self.maxDelay,
+                                                self._flushLater)
+                    self._timer.daemon = True
+                    self._timer.start()
+            properties, removed = changes[:2]
+            if remove:
+                properties.pop(key, None)
+                removed.add(key)
+            else:
+                properties[key] = value
+                removed.discard(key)
+            full = len(self._pending) >= self.maxPending
+        if full:
+            self.flush()
+
+    def setProperty(self, element, key, value):
+        """Records a property set
+        @params element: The Vertex or Edge changed
+        @params key: The property key to set
+        @params value: The value to set"""
+        self._record(element, key, value)
+
+    def removeProperty(self, element, key):
+        """Records a property removal
+        @params element: The Vertex or Edge changed
+        @params key: The key of the property to remove"""
+        self._record(element, key, remove=True)
+
+    def overlay(self, url, properties):
+        """Applies the pending changes of an element to properties just
+        loaded from the server, which does not have them yet
+        @params url: The element url
+        @params properties: The dictionary of properties to update"""
+        with self._lock:
+            for changes in (self._sending.get(url), self._pending.get(url)):
+                if changes is None:
+                    continue
+                properties.update(changes[0])
+                for key in changes[1]:
+                    properties.pop(key, None)
+
+    def discard(self, cls, _id):
+        """Drops the pending changes of a removed element, and the ones
+        of the known edges of a removed vertex
+        @params cls: Vertex or Edge
+        @params _id: The identifier of the removed element"""
+        _id = unicode(_id)
+        with self._lock:
+            for url, changes in self._pending.items():
+                element = changes[2]
+                if element._resource == cls._resource and \
+                        unicode(element.getId()) == _id or \
+                        cls is Vertex and _id in _endpoints(element):
+                    del self._pending[url]
+
+    def _flushLater(self):
+        try:
+            self.flush(failFast=False)
+        except Exception:
+            # Failed writes are in errors, the timer has no caller to
+            # raise to
+            pass
+
+    def _send(self, url, properties, removed):
+        server = self.graph.server
+        if properties:
+            r = server._request('post', url, data=properties)
+            if not r.ok:
+                return "Could not update %s: %s" % (url, r.status_code)
+        if removed:
+            r = server._request('delete', url,
+                                params=dict((key, '') for key in removed))
+            if not r.ok:
+                return "Could not remove properties of %s: %s" % (
+                    url, r.status_code)
+        return None
+
+    def flush(self, failFast=None):
+        """Sends every pending change, one request per element and kind
+        of change
+        @params failFast: Overrides the failFast of the buffer
+
+        @returns The list of the writes that failed, as (url, properties,
+        removed keys, message) tuples, also added to errors"""
+        with self._flushLock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._sending = pending
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            failed = []
+            try:
+                for url, (properties, removed, element) in \
+                        pending.iteritems():
+                    try:
+                        message = self._send(url, properties, removed)
+                    except Exception as e:
+                        message = "Could not write %s: %s" % (url, e)
+                    if message is not None:
+                        failed.append((url, properties, removed, message))
+                        continue
+                    self.graph._propertiesChanged(
+                        element, list(properties) + list(removed))
+            finally:
+                with self._lock:
+                    self._sending = {}
+                    self.errors.extend(failed)
+        if failed and (self.failFast if failFast is None else failFast):
+            raise RexsterException("%d writes failed, the first: %s" %
+                                    (len(failed), failed[0][3]))
+        return failed
+
+    def close(self, failFast=None):
+        """Flushes the pending changes and stops buffering the changes
+        of the graph
+        @params failFast: Overrides the failFast of the buffer"""
+        try:
+            self.flush(failFast)
+        finally:
+            if self.graph._writeBehind is self:
+                self.graph._writeBehind = None
+
+
+def _endpoints(element):
+    """Returns the known vertex ids of an edge, as text"""
+    if isinstance(element, Edge):
+        ends = (element.properties.get('_outV'),
+                element.properties.get('_inV'))
+    else:
+        ends = (getattr(element, '_outV', None),
+                getattr(element, '_inV', None))
+    return [unicode(end) for end in ends if end is not None]
@@ -45,8 +45,17 @@ setup(
         "rexster",
     ],
     include_package_data=True,
+    entry_points={
+        'console_scripts': [
+            'rexster-bulkload = rexster.bulkload:main',
+        ],
+    },
     install_requires=[
         'requests',
         'simplejson',
     ],
+    extras_require={
+        'async': ['gevent'],
+        'export': ['numpy'],
+    },
 )
@@ -6,8 +6,21 @@
 # This test has been performed with a default rexster-0.4.1 distribution #
 ##########################################################################
 
+import os
+import shutil
+import tempfile
 import unittest
 from rexster import *
+from rexster.algorithms import AdjacencySnapshot
+from rexster.bulkload import BulkLoader, IdMap, readEdges, readVertices
+from rexster.export import CSRGraph
+from rexster.invalidation import LocalBus
+from rexster.snapshot import SnapshotGraph, dump
+
+try:
+    import gevent.monkey
+except ImportError:
+    gevent = None
 
 HOST = 'http://localhost:8182'
 GRAPH = 'tinkergraph'
@@ -22,9 +35,8 @@ class RequestServerTestSuite(unittest.TestCase):
         pass
 
     def testServerInvalidConnection(self):
-        self.assertRaises(RexsterException,
-                            RexsterServer,
-                            'http://invalidurl')
+        server = RexsterServer('http://invalidurl')
+        self.assertRaises(RexsterException, server.refresh)
 
     def testServerValidConnection(self):
         server = RexsterServer(HOST)
@@ -42,6 +54,28 @@ class RequestServerTestSuite(unittest.TestCase):
 
         self.assertEqual(server.graphs(), sampleGraphs)
 
+    def testCluster(self):
+        cluster = RexsterCluster(HOST, [HOST])
+        graph = RexsterGraph(cluster, GRAPH)
+        graph.getVertex(1)
+        graph.gremlin_execute('g.V.count()')
+        vertex = graph.addVertex()
+        graph.removeVertex(vertex)
+        primary, replica = cluster.nodeStats()
+        self.assertEqual(primary['requests'], 2)
+        self.assertEqual(replica['requests'], 2)
+        self.assertEqual(len(cluster.checkHealth()), 2)
+
+    def testServerConnectionPool(self):
+        server = RexsterServer(HOST, poolMaxSize=2, timeout=5)
+        graph = RexsterGraph(server, GRAPH)
+        graph.getVertex(1)
+        graph.getVertex(2)
+        stats = server.poolStats()
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
     def testAddRemoveVertex(self):
         server = RexsterServer(HOST)
         graph = RexsterGraph(server, GRAPH)
@@ -64,6 +98,71 @@ class RequestServerTestSuite(unittest.TestCase):
         edges = list(vertex.getInEdges())
         self.assertEqual(edges, [])
 
+    def testAdjacentVertices(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        vertex = graph.getVertex(1)
+        vertices = list(vertex.getOutVertices('knows'))
+        self.assertIsInstance(vertices[0], Vertex)
+        self.assertEqual(sorted(v.getId() for v in vertices), ['2', '4'])
+        self.assertEqual(list(vertex.getInVertices()), [])
+        self.assertEqual(len(list(vertex.getBothVertices())), 3)
+        self.assertEqual(vertex.countOutVertices(), 3)
+        self.assertEqual(vertex.countOutVertices('knows'), 2)
+        self.assertEqual(vertex.countInVertices(), 0)
+        self.assertEqual(vertex.countBothVertices(), 3)
+
+    def testExistenceAndCounts(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        self.assertTrue(graph.hasVertex(1))
+        self.assertFalse(graph.hasVertex(1000))
+        self.assertTrue(graph.hasEdge(7))
+        self.assertFalse(graph.hasEdge(1000))
+        self.assertEqual(graph.countVertices(), 6)
+        self.assertEqual(graph.countEdges(), 6)
+        vertex = graph.getVertex(1)
+        self.assertEqual(vertex.degree(), 3)
+        self.assertEqual(vertex.degree(OUT, 'knows'), 2)
+        self.assertEqual(vertex.degree(IN), 0)
+
+    def testLazyHandles(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        vertex = graph.getVertexHandle('1')
+        self.assertFalse(vertex.isLoaded())
+        self.assertFalse(hasattr(vertex, '__dict__'))
+        edges = list(vertex.getOutEdges())
+        self.assertIsInstance(edges[0], LazyEdge)
+        self.assertEqual(edges[0].getOutVertex(), vertex)
+        self.assertEqual(len(set(edges + edges)), len(edges))
+        self.assertEqual(vertex.getProperty('name'), 'marko')
+        self.assertTrue(vertex.isLoaded())
+        self.assertEqual(vertex.load(), graph.getVertex(1))
+        vertices = list(graph.getVertices(lazy=True))
+        self.assertIsInstance(vertices[0], LazyVertex)
+
+    def testLazyHandlesAsArguments(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterIndexableGraph(server, GRAPH)
+        start = graph.getVertexHandle('1')
+        end = graph.getVertexHandle('2')
+        self.assertEqual(start, graph.getVertex(1))
+        self.assertEqual(len(set([start, graph.getVertex(1)])), 1)
+        # Numeric ids match the text ids of the elements
+        self.assertEqual(graph.getVertexHandle(1), graph.getVertex(1))
+        self.assertIn(graph.getVertexHandle(1), set([graph.getVertex(1)]))
+        edge = graph.addEdge(start, end, 'likes')
+        self.assertEqual(edge.getOutVertex(), start)
+        self.assertEqual(edge.getInVertex(), end)
+        graph.removeEdge(graph.getEdgeHandle(edge.getId()))
+        index = graph.createManualIndex('myHandleIndex', 'vertex')
+        index.put('key1', 'value1', start)
+        self.assertEqual(list(index.get('key1', 'value1')), [start])
+        index.remove('key1', 'value1', start)
+        self.assertEqual(index.count('key1', 'value1'), 0)
+        graph.dropIndex('myHandleIndex')
+
     def testElementProperties(self):
         server = RexsterServer('http://localhost:8182')
         graph = RexsterGraph(server, GRAPH)
@@ -78,6 +177,71 @@ class RequestServerTestSuite(unittest.TestCase):
         vertex.setProperty('name', 'marko')
         self.assertEqual(vertex.getProperty('name'), 'marko')
 
+    def testWriteBehind(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        vertex = graph.getVertex(1)
+        other = RexsterGraph(server, GRAPH).getVertex(1)
+        with graph.writeBehind() as buffer:
+            vertex.setProperty('name', 'pablito')
+            vertex.setProperty('name', 'pablo')
+            vertex.removeProperty('age')
+            self.assertEqual(len(buffer), 1)
+            self.assertEqual(other.getProperty('name'), 'marko')
+            self.assertEqual(vertex.getProperty('name'), 'pablo')
+        self.assertEqual(buffer.errors, [])
+        self.assertEqual(other.getProperty('name'), 'pablo')
+        self.assertIsNone(other.getProperty('age'))
+        vertex.setProperty('name', 'marko')
+        vertex.setProperty('age', 29)
+
+    def testWriteBehindRemoved(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        start = graph.addVertex(properties={'name': 'start'})
+        end = graph.addVertex(properties={'name': 'end'})
+        edge = graph.addEdge(start, end, 'myLabel')
+        with graph.writeBehind() as buffer:
+            start.setProperty('name', 'changed')
+            edge.setProperty('weight', 1)
+            end.setProperty('name', 'changed')
+            graph.removeVertex(start)
+            # The changes to the vertex and its edge are dropped
+            self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer.errors, [])
+        self.assertEqual(graph.getVertex(end.getId()).getProperty('name'),
+                        'changed')
+        graph.removeVertex(end)
+
+    def testElementPropertyCache(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH, cacheMode=CACHED)
+        vertex = graph.getVertex(1)
+        other = RexsterGraph(server, GRAPH).getVertex(1)
+        other.setProperty('name', 'pablito')
+        self.assertEqual(vertex.getProperty('name'), 'marko')
+        vertex.invalidate()
+        self.assertEqual(vertex.getProperty('name'), 'pablito')
+        vertex.setProperty('name', 'marko')
+        self.assertEqual(vertex.getProperty('name'), 'marko')
+        vertex.cacheMode = FRESH
+        self.assertEqual(vertex.getProperty('name'), 'marko')
+
+    def testInvalidationBus(self):
+        server = RexsterServer('http://localhost:8182')
+        bus = LocalBus()
+        graph = RexsterGraph(server, GRAPH, cacheMode=CACHED,
+                            elementCacheSize=10, invalidationBus=bus)
+        other = RexsterGraph(server, GRAPH, cacheMode=CACHED,
+                            elementCacheSize=10, invalidationBus=bus)
+        vertex = graph.getVertex(1)
+        copy = other.getVertex(1)
+        self.assertEqual(copy.getProperty('name'), 'marko')
+        vertex.setProperty('name', 'pablito')
+        self.assertEqual(copy.getProperty('name'), 'pablito')
+        vertex.setProperty('name', 'marko')
+        self.assertEqual(copy.getProperty('name'), 'marko')
+
     def testEdgeMethods(self):
         server = RexsterServer('http://localhost:8182')
         graph = RexsterGraph(server, GRAPH)
@@ -90,6 +254,18 @@ class RequestServerTestSuite(unittest.TestCase):
         self.assertEqual(inVertex.getId(), '2')
         self.assertEqual(edge.getLabel(), 'knows')
 
+    def testElementCache(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH, elementCacheSize=10)
+        vertex = graph.getVertex(1)
+        self.assertIs(graph.getVertex(1), vertex)
+        edge = list(vertex.getOutEdges())[0]
+        self.assertIs(edge.getOutVertex(), vertex)
+        self.assertIs(graph.getEdge(edge.getId()), edge)
+        stats = graph.elementCache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertLessEqual(stats['size'], 10)
+
     def testAddRemoveEdges(self):
         server = RexsterServer('http://localhost:8182')
         graph = RexsterGraph(server, GRAPH)
@@ -101,6 +277,88 @@ class RequestServerTestSuite(unittest.TestCase):
         graph.removeEdge(newEdge)
         self.assertIsNone(graph.getEdge(_id))
 
+    def testBatch(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        with graph.batch(chunkSize=2) as batch:
+            v1 = batch.addVertex(properties={'name': 'v1'})
+            v2 = batch.addVertex(properties={'name': 'v2'})
+            e = batch.addEdge(v1, v2, 'myLabel')
+        self.assertEqual(batch.ids, [v1, v2, e])
+        self.assertEqual(graph.getVertex(v1).getProperty('name'), 'v1')
+        self.assertEqual(graph.getEdge(e).getLabel(), 'myLabel')
+        # Cached copies of an element updated through another one are
+        # dropped at commit
+        cached = RexsterGraph(server, GRAPH, cacheMode=CACHED,
+                            elementCacheSize=10)
+        copy = cached.getVertex(v1)
+        copy.getProperty('name')
+        with cached.batch() as batch:
+            batch.setProperty(cached.getVertexHandle(v1), 'name', 'v3')
+        self.assertEqual(cached.getVertex(v1).getProperty('name'), 'v3')
+        with graph.batch() as batch:
+            batch.removeVertex(v1)
+            batch.removeVertex(v2)
+        self.assertIsNone(graph.getVertex(v1))
+
+    def testBatchIgnoringSuppliedIds(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        # As reported by Neo4j, OrientDB or Titan
+        graph.getMetadata().setdefault('features', {})['ignoresSuppliedIds'] = True
+        batch = graph.batch()
+        v = batch.addVertex(properties={'name': 'ignored'})
+        self.assertIsNone(v)
+        self.assertRaises(RexsterException, batch.addEdge, v, 1, 'myLabel')
+        self.assertEqual(batch.commit(), [])
+        graph.refresh()
+        self.assertFalse(graph.batch().ignoresSuppliedIds())
+        for vertex in list(graph.getVertices()):
+            if vertex.getProperty('name') == 'ignored':
+                graph.removeVertex(vertex)
+
+    def testBulkLoad(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        directory = tempfile.mkdtemp()
+        try:
+            vertices = os.path.join(directory, 'vertices.csv')
+            with open(vertices, 'w') as f:
+                f.write('id,name\nk1,bulk1\nk2,bulk2\n')
+            edges = os.path.join(directory, 'edges.tsv')
+            with open(edges, 'w') as f:
+                f.write('k1\tk2\tbulkLabel\n')
+            idMap = IdMap(os.path.join(directory, 'ids'))
+            loader = BulkLoader(graph, idMap, workers=2, chunkSize=1,
+                                checkpoint=os.path.join(directory, 'cp'))
+            loader.loadVertices(vertices, readVertices(vertices))
+            loader.loadEdges(edges, readEdges(edges))
+            self.assertEqual(loader.loaded, 3)
+            vertex = graph.getVertex(idMap.get('k1'))
+            self.assertEqual(vertex.getProperty('name'), 'bulk1')
+            edge = list(vertex.getOutEdges('bulkLabel'))[0]
+            self.assertEqual(edge.getInVertex().getId(), idMap.get('k2'))
+            graph.removeVertex(vertex)
+            graph.removeVertex(graph.getVertex(idMap.get('k2')))
+            idMap.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def testGetVerticesByIds(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        vertices = list(graph.getVerticesByIds([2, 'missing', 1]))
+        self.assertEqual(vertices[0].getId(), '2')
+        self.assertIsNone(vertices[1])
+        self.assertEqual(vertices[2].getId(), '1')
+        edges = list(graph.getEdgesByIds([7], maxWorkers=1))
+        self.assertEqual(edges[0].getLabel(), 'knows')
+        # Many long ids are split over requests whose URLs stay short
+        ids = ['missing%s' % ('x' * 100 + str(i)) for i in xrange(300)]
+        vertices = list(graph.getVerticesByIds(ids + [1]))
+        self.assertEqual(len(vertices), 301)
+        self.assertEqual(vertices[-1].getId(), '1')
+
     def testGetVertices(self):
         server = RexsterServer('http://localhost:8182')
         graph = RexsterGraph(server, GRAPH)
@@ -108,6 +366,55 @@ class RequestServerTestSuite(unittest.TestCase):
         vertex = vertices[0]
         self.assertIsInstance(vertex, Vertex)
 
+    def testInstrumentation(self):
+        server = RexsterServer(HOST)
+        instrumentation = server.instrument(burstThreshold=3)
+        graph = RexsterGraph(server, GRAPH)
+        for edge in graph.getVertex(1).getOutEdges():
+            edge.getInVertex()
+        stats = server.stats()
+        self.assertEqual(stats['GET /%s/vertices/:id' % GRAPH]['requests'], 4)
+        self.assertEqual(stats['GET /%s/vertices/:id/outE' % GRAPH]['requests'],
+                        1)
+        self.assertEqual(stats['total']['requests'], 5)
+        self.assertTrue(stats['total']['bytesReceived'] > 0)
+        self.assertEqual(instrumentation.bursts[0]['caller'], 'Edge.getInVertex')
+        self.assertEqual(instrumentation.bursts[0]['requests'], 3)
+
+    def testListingRequests(self):
+        server = RexsterServer(HOST)
+        instrumentation = server.instrument()
+        graph = RexsterGraph(server, GRAPH)
+        vertices = list(graph.getVertices())
+        self.assertEqual(len(vertices), 6)
+        # One listing request, no request per vertex
+        self.assertEqual(server.stats()['total']['requests'], 1)
+        vertex = graph.getVertex(1)
+        instrumentation.reset()
+        edges = list(vertex.getOutEdges())
+        self.assertEqual(len(edges), 3)
+        self.assertTrue(all(edge.getLabel() for edge in edges))
+        stats = server.stats()
+        self.assertEqual(stats['total']['requests'], 1)
+        self.assertNotIn('GET /%s/edges/:id' % GRAPH, stats)
+
+    def testGetVerticesPaged(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH, pageSize=2)
+        paged = [vertex.getId() for vertex in graph.getVertices()]
+        whole = [vertex.getId() for vertex in graph.getVertices(pageSize=0)]
+        self.assertEqual(sorted(paged), sorted(whole))
+        edges = list(graph.getVertex(1).getOutEdges(pageSize=1))
+        self.assertEqual(len(edges), 3)
+
+    def testGetVerticesStreamed(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH, pageSize=0, stream=True)
+        streamed = [vertex.getId() for vertex in graph.getVertices()]
+        graph.stream = False
+        loaded = [vertex.getId() for vertex in graph.getVertices()]
+        self.assertEqual(streamed, loaded)
+
     def testGetEdges(self):
         server = RexsterServer('http://localhost:8182')
         graph = RexsterGraph(server, GRAPH)
@@ -115,6 +422,59 @@ class RequestServerTestSuite(unittest.TestCase):
         edge = edges[0]
         self.assertIsInstance(edge, Edge)
 
+    def testGremlinParams(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        graph.registerScript('name', 'g.v(id).name')
+        content = graph.executeScript('name', {'id': '1'})
+        self.assertEqual(content['results'], ['marko'])
+        self.assertRaises(RexsterException, graph.executeScript, 'unknown')
+
+    def testTraversal(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        traversal = graph.getVertex(1).traverse().out('knows').out('created')
+        vertices = list(traversal.has('lang', 'java').dedup().limit(10))
+        self.assertIsInstance(vertices[0], Vertex)
+        self.assertEqual(vertices[0].getProperty('lang'), 'java')
+        self.assertEqual(graph.getVertex(1).traverse().outE().count(), 3)
+
+    def testAdjacencySnapshot(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        snapshot = AdjacencySnapshot(graph, weightKey='weight')
+        self.assertEqual(snapshot.kHop(1, 1, OUT), set(['2', '3', '4']))
+        self.assertEqual(snapshot.shortestPath(1, 5), ['1', '4', '5'])
+        self.assertEqual(snapshot.shortestPath(5, 1), None)
+        distance, path = snapshot.dijkstra(1, 3)
+        self.assertEqual(path, ['1', '3'])
+        self.assertAlmostEqual(distance, 0.4)
+        vertex = graph.addVertex()
+        graph.addEdge(5, vertex, 'knows')
+        snapshot.refresh([5, vertex.getId()])
+        self.assertEqual(snapshot.shortestPath(1, vertex.getId()),
+                        ['1', '4', '5', vertex.getId()])
+        graph.removeVertex(vertex)
+
+    def testCSRExport(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterGraph(server, GRAPH)
+        csr = graph.to_csr(vertexProperties=['age'], edgeProperties=['weight'])
+        self.assertEqual(len(csr), 6)
+        self.assertEqual(len(csr.indices), 6)
+        edges = csr.outEdges(1)
+        self.assertEqual(sorted(csr.ids[csr.indices[edges]]), ['2', '3', '4'])
+        self.assertEqual(csr.vertexProperties['age'][csr.position(1)], 29)
+        directory = tempfile.mkdtemp()
+        try:
+            csr.save(directory)
+            loaded = CSRGraph.load(directory)
+            self.assertEqual(list(loaded.indptr), list(csr.indptr))
+            self.assertEqual(list(loaded.edgeProperties['weight']),
+                            list(csr.edgeProperties['weight']))
+        finally:
+            shutil.rmtree(directory)
+
     def testAddRemoveManualIndex(self):
         server = RexsterServer('http://localhost:8182')
         graph = RexsterIndexableGraph(server, GRAPH)
@@ -155,5 +515,100 @@ class RequestServerTestSuite(unittest.TestCase):
         self.assertEqual(index.count('key1', 'value1'), 0)
         graph.dropIndex('myManualIndex')
 
+    def testIndexLookupCache(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterIndexableGraph(server, GRAPH, indexCacheSize=100)
+        index = graph.createManualIndex('myCachedIndex', 'vertex')
+        index.put('key1', 'value1', graph.getVertex(1))
+        index.put('key1', 'value2', graph.getVertex(2))
+        results = index.get_many([('key1', 'value1'), ('key1', 'value2')])
+        self.assertEqual(results[('key1', 'value1')], [graph.getVertex(1)])
+        self.assertEqual(results[('key1', 'value2')], [graph.getVertex(2)])
+        self.assertEqual(len(graph.indexCache), 2)
+        index.put('key1', 'value1', graph.getVertex(3))
+        self.assertEqual(len(graph.indexCache), 1)
+        counts = index.count_many([('key1', 'value1'), ('key1', 'value2')])
+        self.assertEqual(counts, {('key1', 'value1'): 2, ('key1', 'value2'): 1})
+        # Removed elements leave the cached lookups listing them
+        vertex = graph.addVertex(properties={'name': 'cached'})
+        index.put('key1', 'value3', vertex)
+        self.assertEqual(list(index.get('key1', 'value3')), [vertex])
+        self.assertEqual(index.count('key1', 'value3'), 1)
+        graph.removeVertex(vertex)
+        self.assertEqual(index.count('key1', 'value3'), 0)
+        self.assertEqual(list(index.get('key1', 'value3')), [])
+        self.assertEqual(index.count('key1', 'value2'), 1)
+        graph.dropIndex('myCachedIndex')
+
+    def testSnapshot(self):
+        server = RexsterServer('http://localhost:8182')
+        graph = RexsterIndexableGraph(server, GRAPH)
+        index = graph.createManualIndex('mySnapshotIndex', 'vertex')
+        index.put('key1', 'value1', graph.getVertex(1))
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'graph.snapshot')
+        try:
+            dump(graph, path, {'mySnapshotIndex': [('key1', 'value1')]})
+            with SnapshotGraph(path) as snapshot:
+                vertex = snapshot.getVertex(1)
+                self.assertEqual(vertex.getProperty('name'), 'marko')
+                self.assertEqual(len(list(vertex.getOutEdges())), 3)
+                self.assertEqual(len(list(snapshot.getVertices())), 6)
+                self.assertEqual(len(list(snapshot.getEdges())), 6)
+                vertices = list(snapshot.getIndex('mySnapshotIndex').get(
+                                'key1', 'value1'))
+                self.assertEqual(vertices, [vertex])
+                self.assertRaises(RexsterException, vertex.setProperty,
+                                'name', 'other')
+        finally:
+            shutil.rmtree(directory)
+            graph.dropIndex('mySnapshotIndex')
+
+
+@unittest.skipIf(gevent is None, "the asynchronous client requires gevent")
+class AsyncClientTestSuite(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        gevent.monkey.patch_socket()
+        global asynchronous
+        from rexster import asynchronous
+
+    def testAsyncCalls(self):
+        server = asynchronous.AsyncRexsterServer(HOST)
+        graph = asynchronous.AsyncRexsterGraph(server, GRAPH)
+        calls = [graph.getVertex(_id) for _id in (1, 2, 3)]
+        vertices = [call.get() for call in calls]
+        self.assertIsInstance(vertices[0], asynchronous.AsyncVertex)
+        self.assertEqual(vertices[0].getProperty('name').get(), 'marko')
+        edges = list(vertices[0].getOutEdges())
+        self.assertIsInstance(edges[0], asynchronous.AsyncEdge)
+        self.assertEqual(len(list(graph.getVertices())), 6)
+
+    def testAsyncEquality(self):
+        server = asynchronous.AsyncRexsterServer(HOST)
+        graph = asynchronous.AsyncRexsterGraph(server, GRAPH)
+        vertices = list(graph.getVertices())
+        # Accessors without requests return their value directly
+        self.assertEqual(vertices[0].getId(), vertices[0].properties['_id'])
+        vertex = graph.getVertex(vertices[0].getId()).get()
+        self.assertEqual(vertices[0], vertex)
+        self.assertEqual(len(set([vertices[0], vertex])), 1)
+
+    def testAsyncNestedResults(self):
+        server = asynchronous.AsyncRexsterServer(HOST)
+        graph = asynchronous.AsyncRexsterIndexableGraph(server, GRAPH)
+        index = graph.createManualIndex('myAsyncIndex', 'vertex').get()
+        self.assertIsInstance(index, asynchronous.AsyncIndex)
+        try:
+            vertex = graph.getVertex(1).get()
+            index.put('key1', 'value1', vertex).get()
+            results = index.get_many([('key1', 'value1')]).get()
+            self.assertIsInstance(results[('key1', 'value1')][0],
+                                asynchronous.AsyncVertex)
+            self.assertEqual(results[('key1', 'value1')], [vertex])
+        finally:
+            graph.dropIndex('myAsyncIndex').get()
+
 if __name__ == "__main__":
     unittest.main()